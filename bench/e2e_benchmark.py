@@ -0,0 +1,285 @@
+"""
+Benchmark end-to-end: N chat x M app attraverso scheduler, fetch e notifiche, usando l'applicazione vera
+('main.build_application' e 'set_bot_data') contro il Play Store finto e la Bot API finta, avviati in questo
+stesso processo.
+
+Uso:
+    python bench/e2e_benchmark.py --chats 50 --apps-per-chat 20 --interval 10 --duration 60 --output result.json
+
+Il risultato è un JSON con: controlli al secondo, latenza dei controlli (p50 / p99), latenza delle notifiche
+(dalla nuova versione pubblicata sul Play Store finto al messaggio inviato), lag dell'event loop, RSS e dimensione
+del file di persistenza, più i contatori dei due server finti. Confrontando i JSON di commit diversi si vedono le
+regressioni.
+"""
+import argparse
+import asyncio
+import json
+import os
+import pickle
+import random
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "bench"))
+
+import fake_bot_api  # noqa: E402
+import fake_play_store  # noqa: E402
+
+OWNER_ID = 10
+FIRST_CHAT_ID = 1000
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def summary(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.50),
+        "p99": percentile(values, 0.99),
+        "max": max(values) if values else None
+    }
+
+
+def rss_kb() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+def start_server(server) -> threading.Thread:
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return thread
+
+
+def prepare_workdir(workdir: str):
+    # il bot legge 'config/*.yml' e scrive 'logs/' e la persistenza rispetto alla directory corrente
+    shutil.copytree(os.path.join(REPO_DIR, "config"), os.path.join(workdir, "config"),
+                    ignore=shutil.ignore_patterns("persistence*"))
+    os.makedirs(os.path.join(workdir, "logs"), exist_ok=True)
+
+
+def synthetic_chat_data(args, tz) -> dict:
+    now = datetime.now(tz)
+    interval = timedelta(seconds=args.interval)
+    chat_data = {}
+    for c in range(args.chats):
+        chat_id = FIRST_CHAT_ID + c
+        apps = {}
+        for a in range(1, args.apps_per_chat + 1):
+            n = random.randrange(args.unique_apps)
+            apps[a] = {
+                "app_name": f"Synthetic App {n}",
+                "app_id": f"bench.synthetic.app{n}",
+                "app_link": f"{os.environ['PLAY_STORE_BASE_URL']}/store/apps/details?id=bench.synthetic.app{n}",
+                "current_version": "1.0.0",
+                "last_check": None,
+                "last_update": "01 January 2026",
+                "check_interval": {
+                    "input": {"months": 0, "days": 0, "hours": 0, "minutes": 0, "seconds": args.interval},
+                    "timedelta": interval
+                },
+                "next_check": now + interval * random.random(),
+                "send_on_check": args.send_on_check,
+                "suspended": False
+            }
+        chat_data[chat_id] = {
+            "chat_id": chat_id,
+            "apps": apps,
+            "last_checks": [],
+            "first_boot": False,
+            "settings": {
+                "default_check_interval": {
+                    "input": {"months": 0, "days": 0, "hours": 0, "minutes": 0, "seconds": args.interval},
+                    "timedelta": interval
+                },
+                "default_send_on_check": args.send_on_check
+            }
+        }
+    return chat_data
+
+
+def write_persistence(path: str, chat_data: dict):
+    # stesso formato 'single_file' di PicklePersistence
+    with open(path, "wb") as f:
+        pickle.dump({"conversations": {}, "user_data": {}, "chat_data": chat_data, "bot_data": {},
+                     "callback_data": None}, f)
+
+
+async def loop_lag_probe(samples: list[float], stop: asyncio.Event, period: float = 0.05):
+    while not stop.is_set():
+        start = time.monotonic()
+        await asyncio.sleep(period)
+        samples.append(time.monotonic() - start - period)
+
+
+def instrument_checks(check_durations: list[float]):
+    # avvolge 'scheduled_app_check' in tutte le copie caricate di job_queue (vedi l'import in utils)
+    for name in ("job_queue", "modules.job_queue"):
+        if (module := sys.modules.get(name)) is None or hasattr(module.scheduled_app_check, "bench_original"):
+            continue
+        original = module.scheduled_app_check
+
+        async def timed(context, data, _original=original):
+            start = time.monotonic()
+            try:
+                return await _original(context, data)
+            finally:
+                check_durations.append(time.monotonic() - start)
+
+        timed.bench_original = original
+        module.scheduled_app_check = timed
+
+
+def notification_latencies(store: fake_play_store.FakePlayStore, api: fake_bot_api.FakeBotApi) -> list[float]:
+    # per ogni messaggio "New Update Found": tempo trascorso dalla prima pubblicazione della versione notificata
+    published = {}
+    for at, app_id, version in store.bump_log:
+        published.setdefault((app_id.rsplit("app", 1)[1], version), at)
+
+    latencies = []
+    for call in api.calls:
+        if call["method"] != "sendmessage" or call["status"] != 200:
+            continue
+        if "New Update Found" not in (text := call["params"]["text"]):
+            continue
+        name, version = re.search(r"Synthetic App (\d+)", text), re.search(r"New Version: (\S+)", text)
+        if name is None or version is None:
+            continue
+        if (at := published.get((name.group(1), version.group(1)))) is not None:
+            latencies.append(api.started + call["time"] - at)
+    return latencies
+
+
+async def run(args) -> dict:
+    import pytz
+    tz = pytz.timezone('Europe/Rome')
+
+    store = fake_play_store.FakePlayStore(
+        fake_play_store.load_apps(None, args.unique_apps, args.bump_every),
+        args.play_latency, args.play_jitter, None, args.padding_kb, args.etag)
+    play_server = fake_play_store.build_server("127.0.0.1", 0, store)
+    api = fake_bot_api.FakeBotApi(args.per_chat_rate, args.global_rate)
+    api_server = fake_bot_api.build_server("127.0.0.1", 0, api)
+    start_server(play_server)
+    start_server(api_server)
+
+    os.environ.update({
+        "BOT_TOKEN": "1000000001:benchmark",
+        "OWNER_ID": str(OWNER_ID),
+        "MASTER_ID": str(OWNER_ID),
+        "BOT_API_BASE_URL": f"http://127.0.0.1:{api_server.server_address[1]}/bot",
+        "PLAY_STORE_BASE_URL": f"http://127.0.0.1:{play_server.server_address[1]}",
+        "PLAY_RATE_PER_SECOND": str(args.play_rate),
+        "PLAY_RATE_BURST": str(args.play_rate),
+        "PLAY_FETCH_CONCURRENCY": str(args.concurrency),
+        "PLAY_CACHE_TTL": str(args.cache_ttl),
+        "CATCH_UP_WINDOW_SECONDS": str(args.interval)
+    })
+    write_persistence("config/persistence", synthetic_chat_data(args, tz))
+
+    sys.path[:0] = [REPO_DIR, os.path.join(REPO_DIR, "modules")]
+    import main
+    from instrumentation import instrumentation
+
+    check_durations, lag = [], []
+    appl = main.build_application()
+    await appl.initialize()
+    await appl.post_init(appl)
+    instrument_checks(check_durations)
+
+    stop = asyncio.Event()
+    probe = asyncio.create_task(loop_lag_probe(lag, stop))
+    started = time.monotonic()
+    await appl.start()
+    await appl.updater.start_polling(timeout=1)
+    await asyncio.sleep(args.duration)
+    elapsed = time.monotonic() - started
+
+    stop.set()
+    await probe
+    await appl.updater.stop()
+    await appl.stop()
+    await appl.shutdown()
+    await appl.post_shutdown(appl)
+    play_server.shutdown()
+    api_server.shutdown()
+
+    try:
+        commit = subprocess.run(["git", "-C", REPO_DIR, "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True).stdout.strip()
+    except OSError:
+        commit = None
+
+    return {
+        "commit": commit,
+        "config": vars(args),
+        "elapsed": elapsed,
+        "checks": len(check_durations),
+        "checks_per_second": len(check_durations) / elapsed,
+        "check_latency": summary(check_durations),
+        "notification_latency": summary(notification_latencies(store, api)),
+        "loop_lag": summary(lag),
+        "jobs": instrumentation.stats()["jobs"],
+        "rss_kb": rss_kb(),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "persistence_bytes": os.path.getsize("config/persistence"),
+        "play_store": dict(store.counters),
+        "bot_api": json.loads(json.dumps(api.stats()))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--apps-per-chat", type=int, default=10)
+    parser.add_argument("--unique-apps", type=int, default=100, help="app diverse tra cui scegliere")
+    parser.add_argument("--interval", type=int, default=10, help="intervallo dei controlli in secondi")
+    parser.add_argument("--bump-every", type=int, default=5, help="nuova versione ogni N richieste per app")
+    parser.add_argument("--send-on-check", action="store_true")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--play-latency", type=float, default=50, help="latenza del Play Store finto in ms")
+    parser.add_argument("--play-jitter", type=float, default=20)
+    parser.add_argument("--play-rate", type=float, default=1000, help="limite richieste/s del fetch pool")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--cache-ttl", type=float, default=1, help="TTL della cache dei dettagli in secondi")
+    parser.add_argument("--padding-kb", type=int, default=64)
+    parser.add_argument("--etag", action="store_true")
+    parser.add_argument("--per-chat-rate", type=float, default=1)
+    parser.add_argument("--global-rate", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="file JSON del risultato (default: stdout)")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    output = os.path.abspath(args.output) if args.output else None
+    workdir = tempfile.mkdtemp(prefix="e2e_benchmark_")
+    prepare_workdir(workdir)
+    os.chdir(workdir)
+    try:
+        result = asyncio.run(run(args))
+    finally:
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(result, f, indent=2, default=str)
+    else:
+        print(json.dumps(result, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Confronta l'estrattore minimo di 'play_store' con il parsing completo di 'google_play_scraper' sulle stesse pagine:
+tempo di CPU medio per pagina e picco di memoria allocata.
+
+Uso:
+    python bench/extract_benchmark.py com.whatsapp org.telegram.messenger
+    python bench/extract_benchmark.py --html pagina1.html pagina2.html
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "modules"))
+os.makedirs("logs", exist_ok=True)
+
+import play_store  # noqa: E402
+from google_play_scraper.constants.request import Formats  # noqa: E402
+from google_play_scraper.features.app import parse_dom  # noqa: E402
+
+
+def load_pages(args) -> list[tuple[str, str, str]]:
+    if args.html:
+        pages = []
+        for path in args.targets:
+            with open(path, encoding="utf-8") as f:
+                pages.append((os.path.basename(path), path, f.read()))
+        return pages
+
+    pages = []
+    with httpx.Client(follow_redirects=True) as client:
+        for app_id in args.targets:
+            url = Formats.Detail.build(app_id=app_id, lang="en", country="us")
+            pages.append((app_id, url, client.get(url).raise_for_status().text))
+    return pages
+
+
+def full_parse(dom: str, app_id: str, url: str):
+    return parse_dom(dom, app_id, url)
+
+
+def minimal_parse(dom: str, app_id: str, url: str):
+    return play_store.extract_details(play_store.details_section(dom), app_id, url)
+
+
+def measure(func, pages, rounds: int) -> tuple[float, int]:
+    start = time.process_time()
+    for _ in range(rounds):
+        for app_id, url, dom in pages:
+            func(dom, app_id, url)
+    cpu = (time.process_time() - start) / (rounds * len(pages))
+
+    tracemalloc.start()
+    for app_id, url, dom in pages:
+        func(dom, app_id, url)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return cpu, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("targets", nargs="+", help="app id da scaricare, oppure file HTML con --html")
+    parser.add_argument("--html", action="store_true")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    pages = load_pages(args)
+    for app_id, url, dom in pages:
+        if (details := minimal_parse(dom, app_id, url)) is None:
+            print(f"{app_id}: estrazione minima fallita, verrebbe usato il parsing completo")
+            continue
+        full = full_parse(dom, app_id, url)
+        mismatch = [k for k in play_store.DETAILS_FIELDS if details[k] != full[k]]
+        print(f"{app_id}: {'OK' if not mismatch else f'campi diversi: {mismatch}'}")
+
+    results = {name: measure(func, pages, args.rounds)
+               for name, func in (("full", full_parse), ("minimal", minimal_parse))}
+    for name, (cpu, peak) in results.items():
+        print(f"{name:>8}: {cpu * 1000:8.3f} ms CPU/pagina, picco memoria {peak / 1024:10.1f} KiB")
+    print(f"   ratio: CPU x{results['full'][0] / results['minimal'][0]:.1f}, "
+          f"memoria x{results['full'][1] / results['minimal'][1]:.1f}")
+
+
+if __name__ == "__main__":
+    main()
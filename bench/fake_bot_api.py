@@ -0,0 +1,281 @@
+"""
+Bot API di Telegram finta per test di carico degli handler: registra ogni chiamata con il suo timestamp, simula i
+limiti di flood (429 con 'retry_after') per chat e globali e permette di iniettare update sintetici.
+
+Per usarla con il bot basta impostare nel file .env:
+    BOT_API_BASE_URL=http://127.0.0.1:8081/bot
+    BOT_API_BASE_FILE_URL=http://127.0.0.1:8081/file/bot
+
+Avvio:
+    python bench/fake_bot_api.py --per-chat-rate 1 --global-rate 30
+
+Endpoint di controllo:
+    GET  /_control/calls                 tutte le chiamate registrate (method, chat_id, status, time)
+    GET  /_control/stats                 chiamate e 429 per metodo
+    POST /_control/reset                 azzera chiamate e contatori
+    POST /_control/update                inietta un update (corpo JSON, 'update_id' viene assegnato se manca)
+    POST /_control/message?chat_id=<id>&text=<testo>          inietta un messaggio di testo (es. /start)
+    POST /_control/callback?chat_id=<id>&data=<callback_data>  inietta la pressione di un pulsante
+"""
+import argparse
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+BOT_USER = {"id": 1000000001, "is_bot": True, "first_name": "Fake Checker", "username": "fake_checker_bot",
+            "can_join_groups": True, "can_read_all_group_messages": False, "supports_inline_queries": False}
+
+# metodi che restituiscono il messaggio inviato / modificato
+MESSAGE_METHODS = {"sendmessage", "editmessagetext", "editmessagereplymarkup", "sendphoto", "senddocument"}
+
+
+class FloodLimiter:
+    """
+    Finestra scorrevole di un secondo: oltre 'rate' chiamate nell'ultimo secondo la chiamata viene rifiutata e
+    viene indicato quanti secondi attendere.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._calls = deque()
+
+    def hit(self, now: float) -> int | None:
+        while self._calls and now - self._calls[0] >= 1:
+            self._calls.popleft()
+        if len(self._calls) >= self.rate:
+            return max(1, int(1 - (now - self._calls[0]) + 0.999))
+        self._calls.append(now)
+        return None
+
+
+class FakeBotApi:
+    def __init__(self, per_chat_rate: float, global_rate: float):
+        self.per_chat_rate = per_chat_rate
+        self.global_limiter = FloodLimiter(global_rate)
+        self.chat_limiters: dict[int, FloodLimiter] = {}
+        self.calls = []
+        self.updates = deque()
+        self.lock = threading.Lock()
+        self.new_updates = threading.Condition(self.lock)
+        self._update_id = 0
+        self._message_id = 0
+        self.started = time.monotonic()
+
+    def next_message_id(self) -> int:
+        self._message_id += 1
+        return self._message_id
+
+    def flood_check(self, method: str, chat_id: int | None, now: float) -> int | None:
+        # come su Telegram, i limiti valgono per i messaggi inviati / modificati, non per getUpdates & co.
+        if method not in MESSAGE_METHODS:
+            return None
+        if (retry_after := self.global_limiter.hit(now)) is not None:
+            return retry_after
+        if chat_id is None:
+            return None
+        if (limiter := self.chat_limiters.get(chat_id)) is None:
+            limiter = self.chat_limiters[chat_id] = FloodLimiter(self.per_chat_rate)
+        return limiter.hit(now)
+
+    def record(self, method: str, chat_id: int | None, status: int, params: dict):
+        self.calls.append({
+            "time": time.monotonic() - self.started,
+            "method": method,
+            "chat_id": chat_id,
+            "status": status,
+            "params": params
+        })
+
+    def inject(self, update: dict):
+        with self.new_updates:
+            self._update_id += 1
+            update.setdefault("update_id", self._update_id)
+            self.updates.append(update)
+            self.new_updates.notify_all()
+
+    def get_updates(self, offset: int | None, timeout: float) -> list:
+        with self.new_updates:
+            if offset is not None:
+                while self.updates and self.updates[0]["update_id"] < offset:
+                    self.updates.popleft()
+            if not self.updates and timeout > 0:
+                self.new_updates.wait(timeout)
+            return list(self.updates)
+
+    def stats(self) -> dict:
+        by_method = defaultdict(lambda: {"calls": 0, "flood_limited": 0})
+        for call in self.calls:
+            by_method[call["method"]]["calls"] += 1
+            by_method[call["method"]]["flood_limited"] += call["status"] == 429
+        return {"calls": len(self.calls), "methods": by_method}
+
+
+def user(chat_id: int) -> dict:
+    return {"id": chat_id, "is_bot": False, "first_name": f"User {chat_id}"}
+
+
+def chat(chat_id: int) -> dict:
+    return {"id": chat_id, "type": "private", "first_name": f"User {chat_id}"}
+
+
+class FakeBotApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    api: FakeBotApi = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # il client ha chiuso la connessione (es. getUpdates interrotto alla chiusura del bot)
+            pass
+
+    def _params(self) -> dict:
+        url = urlsplit(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if not (length := int(self.headers.get("Content-Length", 0))):
+            return params
+        body = self.rfile.read(length)
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("application/json"):
+            params.update(json.loads(body))
+        elif content_type.startswith("multipart/form-data"):
+            # upload di file (sendDocument & co.): dei file vengono registrati solo nome e dimensione
+            header = f"Content-Type: {content_type}\r\n\r\n".encode()
+            message = BytesParser(policy=policy.HTTP).parsebytes(header + body)
+            for part in message.iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                payload = part.get_payload(decode=True)
+                if part.get_filename() is not None:
+                    params[name] = {"file_name": part.get_filename(), "file_size": len(payload)}
+                else:
+                    params[name] = payload.decode()
+        else:
+            params.update({k: v[0] for k, v in parse_qs(body.decode()).items()})
+        return params
+
+    def do_GET(self):
+        self.do_POST()
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        params = self._params()
+        if path.startswith("/_control/"):
+            return self._control(path.removeprefix("/_control/"), params)
+
+        # /bot<token>/<method>
+        method = path.rsplit("/", 1)[-1].lower()
+        chat_id = int(params["chat_id"]) if str(params.get("chat_id", "")).lstrip("-").isdigit() else None
+
+        with self.api.lock:
+            retry_after = self.api.flood_check(method, chat_id, time.monotonic())
+            self.api.record(method, chat_id, 429 if retry_after else 200, params)
+            if retry_after:
+                return self._send(429, {"ok": False, "error_code": 429,
+                                        "description": f"Too Many Requests: retry after {retry_after}",
+                                        "parameters": {"retry_after": retry_after}})
+            message_id = self.api.next_message_id() if method.startswith("send") else None
+
+        if method == "getupdates":
+            result = self.api.get_updates(int(params["offset"]) if "offset" in params else None,
+                                          float(params.get("timeout", 0)))
+        elif method == "getme":
+            result = BOT_USER
+        elif method in MESSAGE_METHODS:
+            result = {
+                "message_id": message_id or int(params.get("message_id", 0)),
+                "date": int(time.time()),
+                "chat": chat(chat_id or 0),
+                "from": BOT_USER,
+                "text": params.get("text", "")
+            }
+            if "reply_markup" in params:
+                markup = params["reply_markup"]
+                result["reply_markup"] = json.loads(markup) if isinstance(markup, str) else markup
+        else:
+            result = True
+        self._send(200, {"ok": True, "result": result})
+
+    def _control(self, action: str, params: dict):
+        if action == "calls":
+            with self.api.lock:
+                return self._send(200, {"calls": self.api.calls})
+        if action == "stats":
+            with self.api.lock:
+                return self._send(200, self.api.stats())
+        if action == "reset":
+            with self.api.lock:
+                self.api.calls.clear()
+                self.api.chat_limiters.clear()
+            return self._send(200, {"ok": True})
+
+        if action == "update":
+            update = {k: v for k, v in params.items()}
+        elif action == "message":
+            chat_id = int(params["chat_id"])
+            text = params.get("text", "/start")
+            with self.api.lock:
+                message_id = self.api.next_message_id()
+            message = {"message_id": message_id, "date": int(time.time()), "chat": chat(chat_id),
+                       "from": user(chat_id), "text": text}
+            if text.startswith("/"):
+                message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+            update = {"message": message}
+        elif action == "callback":
+            chat_id = int(params["chat_id"])
+            with self.api.lock:
+                message_id = self.api.next_message_id()
+            update = {"callback_query": {
+                "id": str(message_id),
+                "from": user(chat_id),
+                "chat_instance": str(chat_id),
+                "data": params["data"],
+                "message": {"message_id": int(params.get("message_id", message_id)), "date": int(time.time()),
+                            "chat": chat(chat_id), "from": BOT_USER, "text": "..."}
+            }}
+        else:
+            return self._send(404, {"ok": False})
+
+        self.api.inject(update)
+        self._send(200, {"ok": True, "update_id": update["update_id"]})
+
+
+def build_server(host: str, port: int, api: FakeBotApi) -> ThreadingHTTPServer:
+    handler = type("BoundFakeBotApiHandler", (FakeBotApiHandler,), {"api": api})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--per-chat-rate", type=float, default=1, help="messaggi al secondo per chat")
+    parser.add_argument("--global-rate", type=float, default=30, help="messaggi al secondo in totale")
+    args = parser.parse_args()
+
+    server = build_server(args.host, args.port, FakeBotApi(args.per_chat_rate, args.global_rate))
+    print(f"Fake Bot API on http://{args.host}:{args.port}/bot<token>/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
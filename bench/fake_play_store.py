@@ -0,0 +1,252 @@
+"""
+Play Store finto per test e benchmark: serve pagine di dettaglio con la stessa struttura di quelle reali (blocco
+'ds:5' in un AF_initDataCallback), leggibili sia da 'play_store.extract_details' che da 'google_play_scraper'.
+
+Per usarlo con il bot basta impostare nel file .env:
+    PLAY_STORE_BASE_URL=http://127.0.0.1:8765
+
+Avvio:
+    python bench/fake_play_store.py --fixtures bench/fixtures/apps.json --latency 150 --jitter 50
+    python bench/fake_play_store.py --synthetic 500 --bump-every 20 --rate-limit 50
+
+Le app sono descritte nel file di fixture (vedi 'bench/fixtures/apps.json'); per ogni app si possono indicare:
+    - 'status': risponde sempre con questo codice (es. 404, 429, 503)
+    - 'latency': latenza in millisecondi al posto di quella globale
+    - 'bump_every': ogni N richieste la versione viene incrementata e la data di aggiornamento diventa oggi
+Se esiste 'bench/fixtures/pages/<app_id>.html' viene servita quella pagina registrata invece di quella generata.
+Le app non presenti nelle fixture rispondono 404.
+
+Endpoint di controllo:
+    GET  /_control/stats               contatori delle richieste servite
+    POST /_control/bump?id=<app_id>    incrementa subito la versione di un'app
+    POST /_control/status?id=<app_id>&code=<code>   forza (code=0 ripristina) il codice di risposta di un'app
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+class FakeApp:
+    def __init__(self, app_id: str, title: str, version: str, last_updated_on: str, status: int | None = None,
+                 latency: float | None = None, bump_every: int | None = None):
+        self.app_id = app_id
+        self.title = title
+        self.version = version
+        self.last_updated_on = last_updated_on
+        self.status = status
+        self.latency = latency
+        self.bump_every = bump_every
+        self.requests = 0
+        # timestamp dell'ultimo aggiornamento: fisso tra un 'bump' e l'altro, così le risposte restano identiche
+        self.updated_at = int(time.time())
+
+    def bump(self):
+        parts = self.version.split(".")
+        parts[-1] = str(int(parts[-1]) + 1) if parts[-1].isdigit() else parts[-1] + ".1"
+        self.version = ".".join(parts)
+        self.last_updated_on = datetime.now().strftime("%b %d, %Y").replace(" 0", " ")
+        self.updated_at = int(time.time())
+
+
+class FakePlayStore:
+    """
+    Stato condiviso dal server: app servite, opzioni di latenza / rate limit e contatori.
+    """
+
+    def __init__(self, apps: dict[str, FakeApp], latency: float, jitter: float, rate_limit: float | None,
+                 padding_kb: int, etag: bool):
+        self.apps = apps
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.padding = self._padding(padding_kb)
+        self.etag = etag
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "200": 0, "304": 0, "404": 0, "429": 0, "other": 0, "bumps": 0}
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        # (time.monotonic(), app_id, nuova versione) di ogni aggiornamento simulato
+        self.bump_log = []
+
+    @staticmethod
+    def _padding(padding_kb: int) -> str:
+        # altri blocchi AF_initDataCallback per avvicinare dimensione e costo di parsing a quelli di una pagina vera
+        if padding_kb <= 0:
+            return ""
+        blob = json.dumps([["x" * 100] * 10] * max(1, padding_kb))
+        return "".join(f"<script>AF_initDataCallback({{key: 'ds:{n}', hash: '{n}', data:{blob}, "
+                       f"sideChannel: {{}}}});</script>" for n in (0, 1, 2, 3))
+
+    def rate_limited(self) -> bool:
+        if self.rate_limit is None:
+            return False
+        with self.lock:
+            if (now := time.monotonic()) - self._window_start >= 1:
+                self._window_start = now
+                self._window_count = 0
+            self._window_count += 1
+            return self._window_count > self.rate_limit
+
+    def bump(self, app: FakeApp):
+        # da chiamare con 'lock' acquisito
+        app.bump()
+        self.counters["bumps"] += 1
+        self.bump_log.append((time.monotonic(), app.app_id, app.version))
+
+    def count(self, status: int):
+        with self.lock:
+            self.counters["requests"] += 1
+            self.counters[str(status) if str(status) in self.counters else "other"] += 1
+
+    def render(self, app: FakeApp) -> str:
+        if os.path.isfile(recorded := os.path.join(FIXTURES_DIR, "pages", f"{app.app_id}.html")):
+            with open(recorded, encoding="utf-8") as f:
+                return f.read()
+
+        # stessi percorsi di 'ElementSpecs.Detail': title [1,2,0,0], version [1,2,140,0,0,0],
+        # lastUpdatedOn [1,2,145,0,0]
+        details = [None] * 146
+        details[0] = [app.title]
+        details[140] = [[[app.version]]]
+        details[145] = [[app.last_updated_on, [app.updated_at, 0]]]
+        data = json.dumps([None, [None, None, details]])
+        return (f"<!doctype html><html><head><title>{app.title}</title></head><body>{self.padding}"
+                f"<script>AF_initDataCallback({{key: 'ds:5', hash: '5', data:{data}, sideChannel: {{}}}});"
+                f"</script></body></html>")
+
+
+class FakePlayStoreHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    store: FakePlayStore = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: str = "", content_type: str = "text/html; charset=utf-8",
+              headers: dict | None = None):
+        payload = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # il client ha chiuso la connessione (es. getUpdates interrotto alla chiusura del bot)
+            pass
+        self.store.count(status)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+
+        if url.path == "/_control/stats":
+            with self.store.lock:
+                body = json.dumps(self.store.counters)
+            return self._send(200, body, "application/json")
+
+        if url.path != "/store/apps/details" or "id" not in query:
+            return self._send(404)
+
+        app = self.store.apps.get(app_id := query["id"][0])
+        latency = app.latency if app is not None and app.latency is not None else self.store.latency
+        if (delay := latency + random.uniform(-self.store.jitter, self.store.jitter)) > 0:
+            time.sleep(delay / 1000)
+
+        if self.store.rate_limited():
+            return self._send(429, headers={"Retry-After": "1"})
+        if app is None:
+            return self._send(404)
+        if app.status:
+            return self._send(app.status)
+
+        with self.store.lock:
+            app.requests += 1
+            if app.bump_every and app.requests % app.bump_every == 0:
+                self.store.bump(app)
+
+        headers = {}
+        if self.store.etag:
+            etag = '"' + hashlib.md5(f"{app_id}:{app.version}:{app.last_updated_on}".encode()).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                return self._send(304, headers={"ETag": etag})
+            headers["ETag"] = etag
+
+        self._send(200, self.store.render(app), headers=headers)
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if (app := self.store.apps.get(query.get("id", [""])[0])) is None:
+            return self._send(404)
+
+        with self.store.lock:
+            if url.path == "/_control/bump":
+                self.store.bump(app)
+            elif url.path == "/_control/status":
+                app.status = int(query.get("code", ["0"])[0]) or None
+            else:
+                return self._send(404)
+        self._send(200, json.dumps({"id": app.app_id, "version": app.version, "status": app.status}),
+                   "application/json")
+
+
+def load_apps(fixtures: str | None, synthetic: int, bump_every: int | None) -> dict[str, FakeApp]:
+    apps = {}
+    if fixtures:
+        with open(fixtures, encoding="utf-8") as f:
+            for app_id, a in json.load(f)["apps"].items():
+                apps[app_id] = FakeApp(app_id, a["title"], a["version"], a["lastUpdatedOn"], a.get("status"),
+                                       a.get("latency"), a.get("bump_every", bump_every))
+    for n in range(synthetic):
+        app_id = f"bench.synthetic.app{n}"
+        apps[app_id] = FakeApp(app_id, f"Synthetic App {n}", "1.0.0", "Jan 1, 2026", bump_every=bump_every)
+    return apps
+
+
+def build_server(host: str, port: int, store: FakePlayStore) -> ThreadingHTTPServer:
+    handler = type("BoundFakePlayStoreHandler", (FakePlayStoreHandler,), {"store": store})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixtures", default=os.path.join(FIXTURES_DIR, "apps.json"))
+    parser.add_argument("--synthetic", type=int, default=0, help="numero di app sintetiche da aggiungere")
+    parser.add_argument("--latency", type=float, default=0, help="latenza media in millisecondi")
+    parser.add_argument("--jitter", type=float, default=0, help="variazione massima della latenza in ms")
+    parser.add_argument("--rate-limit", type=float, default=None, help="richieste al secondo prima dei 429")
+    parser.add_argument("--bump-every", type=int, default=None, help="nuova versione ogni N richieste per app")
+    parser.add_argument("--padding-kb", type=int, default=256, help="dimensione dei blocchi dati aggiuntivi")
+    parser.add_argument("--etag", action="store_true", help="invia ETag e rispondi 304 se non cambiato")
+    args = parser.parse_args()
+
+    store = FakePlayStore(load_apps(args.fixtures, args.synthetic, args.bump_every), args.latency, args.jitter,
+                          args.rate_limit, args.padding_kb, args.etag)
+    server = build_server(args.host, args.port, store)
+    print(f"Fake Play Store on http://{args.host}:{args.port} serving {len(store.apps)} apps")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Simulazione con orologio virtuale: fa girare lo scheduler vero ('job_queue.reschedule',
+'job_queue.scheduled_checks_tick', 'job_queue.scheduled_app_check' e 'check_scheduler') per mesi di tempo simulato
+in pochi secondi. Il Play Store è sostituito da un modello in cui ogni app pubblica nuove versioni a intervalli
+casuali (in media ogni '--release-every-days' giorni).
+
+Uso:
+    python bench/simulate_schedule.py --chats 100 --apps-per-chat 20 --days 90 \\
+        --intervals 0m0d1h0min0s,0m0d6h0min0s,0m1d0h0min0s,1m0d0h0min0s --adaptive 0.5
+
+Il risultato (JSON) riporta: controlli eseguiti, ritardo rispetto alla scadenza prevista ('next_check'), tempo
+tra la pubblicazione di una versione e la sua rilevazione, carico sul fetch (richieste per ora simulata) e
+notifiche inviate.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import timedelta
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIRST_CHAT_ID = 1000
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def summary(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 0.50),
+        "p99": percentile(values, 0.99),
+        "max": max(values) if values else None
+    }
+
+
+class PlayStoreModel:
+    """
+    Play Store simulato: ogni app pubblica nuove versioni secondo un processo di Poisson. Tiene il conto delle
+    richieste ricevute per ora simulata.
+    """
+
+    def __init__(self, clock, release_every_days: float):
+        self.clock = clock
+        # la versione iniziale di tutte le app risulta pubblicata all'inizio della simulazione
+        self.start = clock.now()
+        self.mean_gap = timedelta(days=release_every_days)
+        self.releases: dict[str, list] = {}
+        self.next_release: dict[str, object] = {}
+        self.fetches = 0
+        self.fetches_per_hour = Counter()
+
+    def _gap(self) -> timedelta:
+        return self.mean_gap * random.expovariate(1)
+
+    def release_time(self, app_id: str, version: int):
+        return self.releases[app_id][version]
+
+    def current_version(self, app_id: str) -> int:
+        now = self.clock.now()
+        if app_id not in self.releases:
+            self.releases[app_id] = [self.start]
+            self.next_release[app_id] = self.start + self._gap()
+        while self.next_release[app_id] <= now:
+            self.releases[app_id].append(self.next_release[app_id])
+            self.next_release[app_id] += self._gap()
+        return len(self.releases[app_id]) - 1
+
+    async def fetch(self, app_id: str):
+        import play_store
+
+        self.fetches += 1
+        self.fetches_per_hour[int(self.clock.now().timestamp() // 3600)] += 1
+        version = self.current_version(app_id)
+        released = self.releases[app_id][version]
+        return play_store.FetchResult(app_id, f"https://play.google.com/store/apps/details?id={app_id}", 200, "OK",
+                                      details={"title": app_id, "appId": app_id, "url": app_id,
+                                               "version": str(version),
+                                               "lastUpdatedOn": released.strftime("%b %d, %Y")})
+
+
+class SimMessage:
+    def __init__(self, message_id: int):
+        self.id = message_id
+        self.message_id = message_id
+
+
+class SimBot:
+    def __init__(self):
+        self.sent = Counter()
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        self.sent["update" if "New Update Found" in text else "check"] += 1
+        return SimMessage(sum(self.sent.values()))
+
+    async def edit_message_reply_markup(self, **kwargs):
+        return True
+
+
+class SimApplication:
+    def __init__(self, chat_data: dict):
+        self.chat_data = chat_data
+        self.pending = []
+
+    def create_task(self, coroutine, name: str | None = None):
+        self.pending.append(coroutine)
+
+    def mark_data_for_update_persistence(self, chat_ids=None, user_ids=None):
+        pass
+
+
+class SimContext:
+    def __init__(self, application: SimApplication, bot: SimBot):
+        self.application = application
+        self.bot = bot
+
+
+def build_chats(args, now, intervals: list, new_adaptive_state) -> dict:
+    from app_record import AppRecord
+    chat_data = {}
+    for c in range(args.chats):
+        apps = {}
+        for a in range(1, args.apps_per_chat + 1):
+            n = random.randrange(args.unique_apps)
+            apps[a] = AppRecord(
+                app_name=f"app{n}",
+                app_id=f"sim.app{n}",
+                app_link=f"https://play.google.com/store/apps/details?id=sim.app{n}",
+                current_version="0",
+                last_update=now,
+                interval_input=random.choice(intervals),
+                adaptive=new_adaptive_state(random.random() < args.adaptive)
+            )
+            apps[a].next_check = now + apps[a].interval * random.random()
+        chat_data[FIRST_CHAT_ID + c] = {"chat_id": FIRST_CHAT_ID + c, "apps": apps, "last_checks": []}
+    return chat_data
+
+
+async def simulate(args) -> dict:
+    sys.path[:0] = [REPO_DIR, os.path.join(REPO_DIR, "modules")]
+    import clock
+    import job_queue
+    import play_store
+    import utils
+    from app_record import IntervalInput
+    from check_scheduler import check_scheduler
+
+    virtual_clock = clock.VirtualClock()
+    clock.set_clock(virtual_clock)
+    start = virtual_clock.now()
+    end = start + timedelta(days=args.days)
+    tick = timedelta(seconds=args.tick)
+
+    intervals = []
+    for text in args.intervals.split(","):
+        if not isinstance(values := await utils.parse_interval(text.strip()), list):
+            raise ValueError(f"Invalid interval '{text}'")
+        intervals.append(IntervalInput(*values))
+
+    model = PlayStoreModel(virtual_clock, args.release_every_days)
+    play_store.cached_fetch = model.fetch
+
+    chat_data = build_chats(args, start, intervals, job_queue.new_adaptive_state)
+    application, bot = SimApplication(chat_data), SimBot()
+    context = SimContext(application, bot)
+
+    drift, detection = [], []
+    original_check = job_queue.scheduled_app_check
+
+    async def observed_check(ctx, data):
+        # ritardo rispetto alla scadenza registrata e tempo di rilevazione di una nuova versione
+        ap = data["chat_data"]["apps"][data["app_index"]]
+        drift.append((virtual_clock.now() - ap.next_check).total_seconds())
+        seen = int(ap.current_version)
+        await original_check(ctx, data)
+        if int(ap.current_version) != seen:
+            released = model.release_time(ap.app_id, seen + 1)
+            detection.append((virtual_clock.now() - released).total_seconds())
+
+    job_queue.scheduled_app_check = observed_check
+
+    async def restart():
+        overdue = []
+        for cd in chat_data.values():
+            await job_queue.reschedule(application, cd, False, overdue)
+        job_queue.schedule_catch_up(overdue)
+
+    await restart()
+    restarted = args.downtime_hours <= 0
+    outage_at = start + timedelta(days=args.days / 2)
+
+    wall_start = time.monotonic()
+    ticks = 0
+    while (deadline := check_scheduler.next_deadline()) is not None and deadline <= end:
+        if not restarted and deadline >= outage_at:
+            # il bot resta spento per 'downtime_hours' e poi riparte recuperando i controlli arretrati
+            virtual_clock.advance_to(outage_at + timedelta(hours=args.downtime_hours))
+            await restart()
+            restarted = True
+            continue
+
+        # il job 'scheduled_checks_tick' gira ogni 'tick' secondi: la scadenza viene vista al primo tick successivo
+        steps = max(0, math.ceil((deadline - start) / tick))
+        virtual_clock.advance_to(start + tick * steps)
+        await job_queue.scheduled_checks_tick(context)
+        ticks += 1
+        pending, application.pending = application.pending, []
+        await asyncio.gather(*pending)
+
+    hours = max(1, int((end - start).total_seconds() // 3600))
+    per_hour = [model.fetches_per_hour.get(int(start.timestamp() // 3600) + h, 0) for h in range(hours)]
+    return {
+        "config": vars(args),
+        "wall_seconds": time.monotonic() - wall_start,
+        "simulated_days": args.days,
+        "ticks": ticks,
+        "checks": len(drift),
+        "drift_seconds": summary(drift),
+        "detection_latency_seconds": summary(detection),
+        "fetches": model.fetches,
+        "fetches_per_hour": {"mean": sum(per_hour) / hours, "peak": max(per_hour), "p99": percentile(per_hour, 0.99)},
+        "releases": sum(len(r) - 1 for r in model.releases.values()),
+        "notifications": dict(bot.sent)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--apps-per-chat", type=int, default=10)
+    parser.add_argument("--unique-apps", type=int, default=200)
+    parser.add_argument("--intervals", default="0m0d1h0min0s,0m0d6h0min0s,0m1d0h0min0s",
+                        help="intervalli nel formato del bot, separati da virgola; assegnati a caso alle app")
+    parser.add_argument("--days", type=float, default=30, help="giorni da simulare")
+    parser.add_argument("--tick", type=float, default=float(os.getenv("CHECK_TICK_SECONDS", 1)))
+    parser.add_argument("--release-every-days", type=float, default=14, help="giorni medi tra due versioni")
+    parser.add_argument("--adaptive", type=float, default=0, help="frazione di app in modalità adattiva")
+    parser.add_argument("--downtime-hours", type=float, default=0, help="spegnimento simulato a metà periodo")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="file JSON del risultato (default: stdout)")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    output = os.path.abspath(args.output) if args.output else None
+    workdir = tempfile.mkdtemp(prefix="simulate_schedule_")
+    os.makedirs(os.path.join(workdir, "logs"))
+    os.chdir(workdir)
+    try:
+        result = asyncio.run(simulate(args))
+    finally:
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(result, f, indent=2, default=str)
+    else:
+        print(json.dumps(result, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
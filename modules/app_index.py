@@ -0,0 +1,71 @@
+from app_record import AppRecord
+
+# caratteri considerati nel confronto tra nomi (vedi 'normalize_name')
+NAME_WHITELIST = frozenset('abcdefghijklmnopqrstuvwxyz ')
+
+
+def normalize_name(name: str) -> str:
+    return ''.join(filter(NAME_WHITELIST.__contains__, str(name).lower())).replace("  ", " ")
+
+
+class ChatAppIndex:
+    """
+    Indici secondari sulle app di una chat: app_id → indici, nome normalizzato → indici e insieme delle app sospese.
+    Gli indici sono le chiavi stabili di 'chat_data["apps"]'; per ogni app_id / nome sono tenuti in ordine di
+    inserimento (dict usato come insieme ordinato), così la ricerca restituisce la prima app dell'elenco.
+    """
+
+    __slots__ = ("by_app_id", "by_name", "suspended")
+
+    def __init__(self, apps: dict[int, AppRecord]):
+        self.by_app_id: dict[str, dict[int, None]] = {}
+        self.by_name: dict[str, dict[int, None]] = {}
+        self.suspended: set[int] = set()
+        for index, ap in apps.items():
+            self.add(index, ap)
+
+    def add(self, index: int, ap: AppRecord):
+        self.by_app_id.setdefault(ap.app_id, {})[index] = None
+        self.by_name.setdefault(normalize_name(ap.app_name), {})[index] = None
+        self.set_suspended(index, ap.suspended)
+
+    def remove(self, index: int, ap: AppRecord):
+        for table, key in ((self.by_app_id, ap.app_id), (self.by_name, normalize_name(ap.app_name))):
+            if (indexes := table.get(key)) is not None:
+                indexes.pop(index, None)
+                if not indexes:
+                    del table[key]
+        self.suspended.discard(index)
+
+    def set_suspended(self, index: int, suspended: bool):
+        if suspended:
+            self.suspended.add(index)
+        else:
+            self.suspended.discard(index)
+
+    def find_app_id(self, app_id: str) -> int | None:
+        return next(iter(self.by_app_id.get(app_id, ())), None)
+
+    def find_name(self, normalized_name: str) -> int | None:
+        return next(iter(self.by_name.get(normalized_name, ())), None)
+
+
+class AppIndexes:
+    """
+    Indici di tutte le chat, non salvati nella persistenza: vengono costruiti al primo accesso e ricostruiti se
+    'chat_data["apps"]' viene sostituito (es. ripristino di un backup) o dopo 'invalidate'.
+    """
+
+    def __init__(self):
+        self._chats: dict[int, tuple[dict, ChatAppIndex]] = {}
+
+    def get(self, cd: dict) -> ChatAppIndex:
+        if (entry := self._chats.get(cd["chat_id"])) is None or entry[0] is not cd["apps"]:
+            entry = self._chats[cd["chat_id"]] = (cd["apps"], ChatAppIndex(cd["apps"]))
+        return entry[1]
+
+    def invalidate(self, chat_id: int):
+        self._chats.pop(chat_id, None)
+
+
+app_indexes = AppIndexes()
@@ -0,0 +1,128 @@
+import sys
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+# formato di 'last_update' nei dict delle versioni precedenti (persistenza e backup)
+LAST_UPDATE_FORMAT = "%d %B %Y"
+
+
+class IntervalInput(NamedTuple):
+    """
+    Intervallo così come indicato dall'utente ('?m?d?h?min?s'): serve solo per mostrarlo, per i calcoli si usa
+    'AppRecord.interval'.
+    """
+    months: int = 0
+    days: int = 0
+    hours: int = 0
+    minutes: int = 0
+    seconds: int = 0
+
+    def timedelta(self) -> timedelta:
+        return timedelta(days=self.months * 30 + self.days, hours=self.hours, minutes=self.minutes,
+                         seconds=self.seconds)
+
+    @classmethod
+    def from_setting(cls, check_interval: dict) -> "IntervalInput":
+        # {"input": {"months": ..., ...}, "timedelta": ...} di 'default_check_interval' e delle vecchie app
+        return cls(**{k: int(v) for k, v in check_interval["input"].items()})
+
+
+class AppRecord:
+    """
+    Un'app controllata da una chat ('chat_data["apps"][i]'). Sostituisce il dict annidato delle versioni
+    precedenti: campi tipizzati, niente dict per istanza e stato di pickle ridotto a una tupla. 'from_dict' e
+    'to_dict' convertono da / verso il vecchio formato (persistenza e backup).
+    """
+
+    __slots__ = ("app_name", "app_id", "app_link", "current_version", "last_update", "last_check", "next_check",
+                 "interval", "interval_input", "send_on_check", "suspended", "adaptive")
+
+    def __init__(self, app_name: str, app_id: str, app_link: str, current_version: str, last_update: datetime,
+                 interval_input: IntervalInput | None = None, send_on_check: bool = False,
+                 next_check: datetime | None = None, last_check: datetime | None = None, suspended: bool = False,
+                 adaptive: dict | None = None):
+        self.app_name = app_name
+        self.app_id = sys.intern(app_id)
+        self.app_link = sys.intern(app_link)
+        self.current_version = current_version
+        self.last_update = last_update
+        self.last_check = last_check
+        self.next_check = next_check
+        self.interval = None
+        self.interval_input = None
+        self.set_interval(interval_input or IntervalInput())
+        self.send_on_check = send_on_check
+        self.suspended = suspended
+        self.adaptive = adaptive
+
+    def set_interval(self, interval_input: IntervalInput):
+        self.interval_input = IntervalInput(*interval_input)
+        self.interval = self.interval_input.timedelta()
+
+    @property
+    def last_update_text(self) -> str:
+        return self.last_update.strftime(LAST_UPDATE_FORMAT)
+
+    @property
+    def interval_text(self) -> str:
+        i = self.interval_input
+        return f"{i.months}m{i.days}d{i.hours}h{i.minutes}min{i.seconds}s"
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "AppRecord":
+        last_update = d["last_update"]
+        if not isinstance(last_update, datetime):
+            last_update = datetime.strptime(last_update, LAST_UPDATE_FORMAT)
+        return cls(d["app_name"], d["app_id"], d["app_link"], d["current_version"], last_update,
+                   IntervalInput.from_setting(d["check_interval"]) if "check_interval" in d else None,
+                   d.get("send_on_check", False), d.get("next_check"), d.get("last_check"),
+                   d.get("suspended", False), d.get("adaptive"))
+
+    def to_dict(self) -> dict:
+        return {
+            "app_name": self.app_name,
+            "app_id": self.app_id,
+            "app_link": self.app_link,
+            "current_version": self.current_version,
+            "last_check": self.last_check,
+            "last_update": self.last_update_text,
+            "check_interval": {
+                "input": self.interval_input._asdict(),
+                "timedelta": self.interval
+            },
+            "next_check": self.next_check,
+            "send_on_check": self.send_on_check,
+            "suspended": self.suspended,
+            "adaptive": self.adaptive
+        }
+
+    def __getstate__(self) -> tuple:
+        return (self.app_name, self.app_id, self.app_link, self.current_version, self.last_update, self.last_check,
+                self.next_check, tuple(self.interval_input), self.send_on_check, self.suspended, self.adaptive)
+
+    def __setstate__(self, state: tuple):
+        (self.app_name, app_id, app_link, self.current_version, self.last_update, self.last_check,
+         self.next_check, interval_input, self.send_on_check, self.suspended, self.adaptive) = state
+        self.app_id = sys.intern(app_id)
+        self.app_link = sys.intern(app_link)
+        self.set_interval(IntervalInput(*interval_input))
+
+    def __repr__(self):
+        return f"AppRecord(app_id={self.app_id}, app_name={self.app_name}, current_version={self.current_version})"
+
+
+def upgrade_apps(cd: dict) -> int:
+    """
+    Converte in AppRecord le app di una chat salvate come dict (persistenza o backup di versioni precedenti).
+    Restituisce il numero di app convertite; quelle con chiavi mancanti restano dict e vengono scartate da
+    'job_queue.reschedule'.
+    """
+    converted = 0
+    for index, ap in (cd.get("apps") or {}).items():
+        if isinstance(ap, dict):
+            try:
+                cd["apps"][index] = AppRecord.from_dict(ap)
+            except (KeyError, TypeError, ValueError):
+                continue
+            converted += 1
+    return converted
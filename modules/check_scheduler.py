@@ -0,0 +1,100 @@
+import heapq
+import itertools
+from datetime import datetime
+
+
+class CheckScheduler:
+    """
+    Scadenze dei controlli di tutte le app di tutte le chat, tenute in un unico min-heap ordinato per 'next_check'.
+    Un solo job del JobQueue (vedi 'job_queue.scheduled_checks_tick') estrae ad ogni tick le app scadute.
+
+    Le voci vengono invalidate in modo "lazy": cancellare o riprogrammare un'app costa O(1) / O(log n) e le voci
+    non più valide vengono scartate quando arrivano in cima all'heap. Il registro delle voci è diviso per chat
+    (chat_id → indice stabile dell'app → voce), così cancellare una chat costa quanto le sue app e il numero di
+    controlli programmati per chat è immediato.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._entries: dict[int, dict[int, list]] = {}
+        self._size = 0
+        self._counter = itertools.count()
+
+    def _register(self, chat_id: int, app_index: int, when: datetime) -> list:
+        self.cancel(chat_id, app_index)
+        entry = [when, next(self._counter), chat_id, app_index, True]
+        self._entries.setdefault(chat_id, {})[app_index] = entry
+        self._size += 1
+        return entry
+
+    def _unregister(self, chat_id: int, app_index: int) -> list | None:
+        if (chat := self._entries.get(chat_id)) is None or (entry := chat.pop(app_index, None)) is None:
+            return None
+        if not chat:
+            del self._entries[chat_id]
+        self._size -= 1
+        return entry
+
+    def schedule(self, chat_id: int, app_index: int, when: datetime):
+        heapq.heappush(self._heap, self._register(chat_id, app_index, when))
+        if len(self._heap) > 2 * self._size + 64:
+            self._compact()
+
+    def schedule_many(self, chat_id: int, deadlines: dict[int, datetime]):
+        """
+        Registra in blocco le scadenze di più app della stessa chat: l'heap viene ricostruito una volta sola.
+        """
+        for app_index, when in deadlines.items():
+            self._heap.append(self._register(chat_id, app_index, when))
+        self._compact()
+
+    def cancel(self, chat_id: int, app_index: int) -> bool:
+        if (entry := self._unregister(chat_id, app_index)) is None:
+            return False
+        entry[-1] = False
+        return True
+
+    def cancel_chat(self, chat_id: int):
+        for entry in self._entries.pop(chat_id, {}).values():
+            entry[-1] = False
+            self._size -= 1
+
+    def get_deadline(self, chat_id: int, app_index: int) -> datetime | None:
+        if (entry := self._entries.get(chat_id, {}).get(app_index)) is None:
+            return None
+        return entry[0]
+
+    def count(self, chat_id: int) -> int:
+        return len(self._entries.get(chat_id, ()))
+
+    def counts(self) -> dict[int, int]:
+        # controlli programmati per chat
+        return {chat_id: len(chat) for chat_id, chat in self._entries.items()}
+
+    def pop_due(self, now: datetime) -> list[tuple[int, int, datetime]]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            when, _, chat_id, app_index, valid = heapq.heappop(self._heap)
+            if not valid:
+                continue
+            self._unregister(chat_id, app_index)
+            due.append((chat_id, app_index, when))
+        return due
+
+    def next_deadline(self) -> datetime | None:
+        while self._heap and not self._heap[0][-1]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if entry[-1]]
+        heapq.heapify(self._heap)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, key: tuple[int, int]):
+        return key[1] in self._entries.get(key[0], ())
+
+
+check_scheduler = CheckScheduler()
@@ -0,0 +1,50 @@
+import datetime
+
+import pytz
+
+TIMEZONE = pytz.timezone('Europe/Rome')
+
+
+class Clock:
+    """
+    Orologio usato per tutte le scadenze dei controlli ('next_check', heap dello scheduler, recupero all'avvio).
+    Normalmente è l'ora reale; le simulazioni lo sostituiscono con un VirtualClock tramite 'set_clock'.
+    """
+
+    def now(self) -> datetime.datetime:
+        return datetime.datetime.now(TIMEZONE)
+
+
+class VirtualClock(Clock):
+    """
+    Orologio che avanza solo quando richiesto: permette di simulare mesi di controlli in pochi secondi.
+    """
+
+    def __init__(self, start: datetime.datetime | None = None):
+        self._now = start if start is not None else datetime.datetime.now(TIMEZONE)
+
+    def now(self) -> datetime.datetime:
+        return self._now
+
+    def advance(self, delta: datetime.timedelta):
+        self._now += delta
+
+    def advance_to(self, when: datetime.datetime):
+        if when > self._now:
+            self._now = when
+
+
+_clock = Clock()
+
+
+def set_clock(clock: Clock):
+    global _clock
+    _clock = clock
+
+
+def get_clock() -> Clock:
+    return _clock
+
+
+def now() -> datetime.datetime:
+    return _clock.now()
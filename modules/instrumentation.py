@@ -0,0 +1,198 @@
+import asyncio
+import bisect
+import functools
+import json
+import os
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from dotenv import load_dotenv
+
+import clock
+
+load_dotenv()
+
+# periodo del probe sul lag dell'event loop e numero di esecuzioni recenti tenute per il dump
+LOOP_LAG_PROBE_INTERVAL = float(os.getenv("LOOP_LAG_PROBE_INTERVAL", 0.5))
+JOB_RECORDS_KEPT = int(os.getenv("JOB_RECORDS_KEPT", 1000))
+INSTRUMENTATION_DUMP = os.getenv("INSTRUMENTATION_DUMP", "logs/instrumentation.json")
+
+# limiti superiori dei bucket in secondi (1 ms → 10 min), più un bucket finale per i valori oltre
+BUCKETS = [m * 10 ** e for e in range(-3, 3) for m in (1, 2.5, 5)] + [600]
+
+
+class Histogram:
+    """
+    Istogramma a bucket fissi (scala logaritmica): costo O(log b) per campione e memoria costante. I percentili
+    sono stimati con il limite superiore del bucket che li contiene.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        value = max(value, 0.0)
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, p: float) -> float | None:
+        if not self.count:
+            return None
+        rank = p * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+    def stats(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(0.50),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+            "buckets": {str(b): n for b, n in zip(BUCKETS + ["+inf"], self.counts) if n}
+        }
+
+
+class JobStats:
+    def __init__(self):
+        self.lateness = Histogram()
+        self.duration = Histogram()
+        self.outcomes = Counter()
+
+
+class Instrumentation:
+    """
+    Per ogni callback del JobQueue (vedi 'job_queue') registra orario previsto, avvio effettivo, durata ed esito;
+    il probe sul loop misura di quanto si allungano dei brevi sleep, cioè per quanto il loop resta bloccato.
+    """
+
+    def __init__(self):
+        self.jobs: dict[str, JobStats] = {}
+        self.records = deque(maxlen=JOB_RECORDS_KEPT)
+        self.loop_lag = Histogram()
+        self.started = datetime.now(clock.TIMEZONE)
+        self._probe = None
+
+    def record(self, name: str, scheduled: datetime | None, started: datetime, duration: float, outcome: str):
+        if (stats := self.jobs.get(name)) is None:
+            stats = self.jobs[name] = JobStats()
+        lateness = (started - scheduled).total_seconds() if scheduled is not None else None
+        if lateness is not None:
+            stats.lateness.observe(lateness)
+        stats.duration.observe(duration)
+        stats.outcomes[outcome] += 1
+        self.records.append({"job": name, "scheduled": scheduled, "started": started, "lateness": lateness,
+                             "duration": duration, "outcome": outcome})
+
+    async def _probe_loop(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(LOOP_LAG_PROBE_INTERVAL)
+            self.loop_lag.observe(time.perf_counter() - start - LOOP_LAG_PROBE_INTERVAL)
+
+    def start_probe(self):
+        if self._probe is None or self._probe.done():
+            self._probe = asyncio.get_running_loop().create_task(self._probe_loop(), name="loop_lag_probe")
+
+    async def stop_probe(self):
+        if self._probe is not None:
+            self._probe.cancel()
+            try:
+                await self._probe
+            except asyncio.CancelledError:
+                pass
+            self._probe = None
+
+    def stats(self) -> dict:
+        return {
+            "since": self.started,
+            "loop_lag": self.loop_lag.stats(),
+            "jobs": {name: {"lateness": s.lateness.stats(), "duration": s.duration.stats(),
+                            "outcomes": dict(s.outcomes)} for name, s in self.jobs.items()}
+        }
+
+    def summary_text(self) -> str:
+        def fmt(value: float | None) -> str:
+            return "–" if value is None else f"{value * 1000:.0f}ms" if value < 1 else f"{value:.1f}s"
+
+        def line(h: Histogram) -> str:
+            return (f"p50 {fmt(h.percentile(0.5))} · p99 {fmt(h.percentile(0.99))} · "
+                    f"max {fmt(h.max if h.count else None)}")
+
+        text = (f"📊 <b>Statistiche JobQueue</b>\n"
+                f"<i>dal {self.started.strftime('%d %B %Y %H:%M:%S')}</i>\n\n"
+                f"🔸 <u>Lag Event Loop</u> ({self.loop_lag.count} campioni)\n"
+                f"    <code>{line(self.loop_lag)}</code>\n")
+        for name, s in sorted(self.jobs.items()):
+            outcomes = ", ".join(f"{k}: {v}" for k, v in sorted(s.outcomes.items()))
+            text += f"\n🔸 <u>{name}</u> ({outcomes})\n"
+            if s.lateness.count:
+                text += f"    ⏰ Ritardo: <code>{line(s.lateness)}</code>\n"
+            text += f"    ⏱ Durata: <code>{line(s.duration)}</code>\n"
+        return text
+
+    def dump(self, path: str = INSTRUMENTATION_DUMP) -> str:
+        with open(path, "w") as f:
+            json.dump({**self.stats(), "records": list(self.records)}, f, indent=2, default=str)
+        return path
+
+
+def scheduled_time(context, data: dict | None) -> datetime | None:
+    """
+    Orario previsto di esecuzione: 'scheduled_at' nei dati (controlli avviati da 'scheduled_checks_tick'),
+    altrimenti ricavato dal trigger del job APScheduler (data fissa o ultimo istante dell'intervallo).
+    """
+    if data is not None and (when := data.get("scheduled_at")) is not None:
+        return when
+    if (job := getattr(context, "job", None)) is None:
+        return None
+    trigger = job.job.trigger
+    if isinstance(trigger, DateTrigger):
+        return trigger.run_date
+    if isinstance(trigger, IntervalTrigger):
+        now = datetime.now(trigger.start_date.tzinfo)
+        elapsed = (now - trigger.start_date).total_seconds()
+        return trigger.start_date + trigger.interval * max(0, int(elapsed // trigger.interval_length))
+    return None
+
+
+def instrumented(name: str):
+    """
+    Decoratore per le callback del JobQueue: i dati vengono presi dal secondo argomento (se presente) o da
+    'context.job.data'.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(context, *args, **kwargs):
+            data = args[0] if args else getattr(getattr(context, "job", None), "data", None)
+            scheduled = scheduled_time(context, data if isinstance(data, dict) else None)
+            started = clock.now()
+            start = time.perf_counter()
+            outcome = "ok"
+            try:
+                return await func(context, *args, **kwargs)
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                raise
+            except Exception:
+                outcome = "error"
+                raise
+            finally:
+                instrumentation.record(name, scheduled, started, time.perf_counter() - start, outcome)
+        return wrapper
+    return decorator
+
+
+instrumentation = Instrumentation()
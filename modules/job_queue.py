@@ -1,14 +1,20 @@
 import datetime
+import random
+import time
 from dotenv import load_dotenv
 import os
-import pytz
 
-import requests
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, Application
 import telegram
-from google_play_scraper import app
-from google_play_scraper.exceptions import NotFoundError
+
+import clock
+import play_store
+from instrumentation import instrumented
+from metrics import metrics
+from check_scheduler import check_scheduler
+from app_record import AppRecord
+from app_index import app_indexes
 
 import logging
 from concurrent_log_handler import ConcurrentRotatingFileHandler
@@ -28,7 +34,46 @@ job_queue_logger.addHandler(console_handler)
 load_dotenv()
 WHO = os.getenv("OWNER_ID")
 
+# modalità adattiva: l'intervallo impostato dall'utente resta il ritardo massimo. Si parte da 1/'ADAPTIVE_MAX_FACTOR'
+# di quell'intervallo (mai sotto 'ADAPTIVE_MIN_SECONDS'), che raddoppia dopo 'ADAPTIVE_NO_CHANGE_STREAK' controlli
+# consecutivi senza aggiornamenti fino a tornare all'intervallo impostato; trovato un aggiornamento si riparte
+ADAPTIVE_NO_CHANGE_STREAK = int(os.getenv("ADAPTIVE_NO_CHANGE_STREAK", 3))
+ADAPTIVE_MAX_FACTOR = int(os.getenv("ADAPTIVE_MAX_FACTOR", 8))
+ADAPTIVE_MIN_SECONDS = float(os.getenv("ADAPTIVE_MIN_SECONDS", 30))
+
+# all'avvio i controlli arretrati vengono distribuiti in 'CATCH_UP_WINDOW_SECONDS' secondi invece di partire tutti
+# insieme; quelli non scaduti vengono sfasati di al massimo 'PHASE_JITTER_SECONDS' secondi
+CATCH_UP_WINDOW_SECONDS = float(os.getenv("CATCH_UP_WINDOW_SECONDS", 300))
+PHASE_JITTER_SECONDS = float(os.getenv("PHASE_JITTER_SECONDS", 30))
+
+
+def new_adaptive_state(enabled: bool = False) -> dict:
+    return {"enabled": enabled, "no_change": 0, "factor": 1 / ADAPTIVE_MAX_FACTOR}
+
+
+def effective_interval(ap: AppRecord) -> datetime.timedelta:
+    if (adaptive := ap.adaptive) is None or not adaptive["enabled"]:
+        return ap.interval
+    # 'factor' > 1 negli stati salvati dalle versioni precedenti: l'intervallo impostato resta comunque il massimo
+    floor = min(ap.interval, datetime.timedelta(seconds=ADAPTIVE_MIN_SECONDS))
+    return max(ap.interval * min(adaptive["factor"], 1), floor)
+
+
+def update_adaptive_state(ap: AppRecord, update_found: bool):
+    if (adaptive := ap.adaptive) is None or not adaptive["enabled"]:
+        return
+    if update_found:
+        # appena trovato un aggiornamento si torna all'intervallo più breve
+        adaptive["no_change"] = 0
+        adaptive["factor"] = 1 / ADAPTIVE_MAX_FACTOR
+        return
+    adaptive["no_change"] += 1
+    if adaptive["no_change"] >= ADAPTIVE_NO_CHANGE_STREAK:
+        adaptive["no_change"] = 0
+        adaptive["factor"] = min(adaptive["factor"] * 2, 1)
+
 
+@instrumented("scheduled_send_message")
 async def scheduled_send_message(context: ContextTypes.DEFAULT_TYPE):
     data = context.job.data
     if "chat_id" not in data or "text" not in data:
@@ -126,6 +171,7 @@ async def scheduled_send_message(context: ContextTypes.DEFAULT_TYPE):
         job_queue_logger.error(f'Not able to perform scheduled action: {e}')
 
 
+@instrumented("scheduled_edit_message")
 async def scheduled_edit_message(context: ContextTypes.DEFAULT_TYPE):
     data = context.job.data
     if "chat_id" not in data or "text" not in data or "message_id" not in data:
@@ -146,6 +192,7 @@ async def scheduled_edit_message(context: ContextTypes.DEFAULT_TYPE):
         job_queue_logger.error(f'Not able to perform scheduled action: {e}')
 
 
+@instrumented("scheduled_delete_message")
 async def scheduled_delete_message(context: ContextTypes.DEFAULT_TYPE):
     if "message_id" not in context.job.data or "chat_id" not in context.job.data:
         job_queue_logger.error("Missing message_id or chat_id in job data")
@@ -158,84 +205,97 @@ async def scheduled_delete_message(context: ContextTypes.DEFAULT_TYPE):
         job_queue_logger.warning(f'Not able to perform scheduled action: {e}')
 
 
-async def scheduled_app_check(context: ContextTypes.DEFAULT_TYPE):
-    if ("chat_data" not in context.job.data or "app_id" not in context.job.data or "app_link" not in context.job.data
-            or "app_index" not in context.job.data):
+@instrumented("scheduled_app_check")
+async def scheduled_app_check(context: ContextTypes.DEFAULT_TYPE, data: dict):
+    if "chat_data" not in data or "app_id" not in data or "app_link" not in data or "app_index" not in data:
         job_queue_logger.error("'app_id' or 'app_link' or 'app_index' are missing in Job data.")
         return
 
-    cd = context.job.data["chat_data"]
+    cd = data["chat_data"]
 
-    if (ap := cd["apps"][context.job.data["app_index"]])["suspended"]:
-        job_queue_logger.info(f"Check Suspended for app {ap['app_name']}.")
+    if (ap := cd["apps"].get(data["app_index"])) is None:
+        # app rimossa dopo la pianificazione del controllo
+        job_queue_logger.info("App at index %s no longer exists, check skipped.", data["app_index"])
         return
 
-    if (res := requests.get(context.job.data["app_link"])).status_code != 200:
-        job_queue_logger.error(f"Not Able to Get Link {context.job.data['app_link']}: {res.reason}")
+    if ap.suspended:
+        job_queue_logger.info("Check Suspended for app %s.", ap.app_name)
         return
 
-    try:
-        app_details = app(app_id=context.job.data["app_id"])
-    except NotFoundError as e:
-        job_queue_logger.error(f"App '{context.job.data['app_id']}' not found: {e}")
+    metrics.inc("checks_total")
+    started = time.perf_counter()
+    result = await play_store.cached_fetch(app_id=data["app_id"])
+    metrics.observe("check_fetch_seconds", time.perf_counter() - started)
+
+    if not result.ok():
+        metrics.inc("fetch_errors_total", reason=result.reason)
+        if result.not_found():
+            job_queue_logger.error("App '%s' not found: %s", data['app_id'], result.error)
+        else:
+            job_queue_logger.error("Not Able to Get Link %s: %s", data['app_link'], result.reason)
     else:
-        index = context.job.data["app_index"]
-        ap = cd["apps"][index]
-        ap["last_check"] = datetime.datetime.now(pytz.timezone('Europe/Rome'))
-        ap["next_check"] = datetime.datetime.now(pytz.timezone('Europe/Rome')) + ap["check_interval"]["timedelta"]
+        app_details = result.details
+        index = data["app_index"]
+        if cd["apps"].get(index) is not ap:
+            # app rimossa mentre il controllo era in corso: l'indice non viene riassegnato ad altre app
+            return
+        ap.last_check = clock.now()
         new_version = app_details.get("version")
         update_date = datetime.datetime.strptime(app_details.get("lastUpdatedOn"), '%b %d, %Y')
 
-        if isinstance(ap["last_update"], datetime.datetime):
-            check = (new_version != ap["current_version"] or
-                     update_date.strftime("%d %B %Y") != ap["last_update"].strftime("%d %B %Y"))
-        else:
-            check = (new_version != ap["current_version"] or
-                     update_date.strftime("%d %B %Y") != ap["last_update"])
+        check = new_version != ap.current_version or update_date.date() != ap.last_update.date()
+
+        if check:
+            metrics.inc("updates_found_total")
+        update_adaptive_state(ap, check)
+        ap.next_check = ap.last_check + effective_interval(ap)
+        if not ap.suspended:
+            check_scheduler.schedule(cd["chat_id"], index, ap.next_check)
+        context.application.mark_data_for_update_persistence(chat_ids=cd["chat_id"])
 
         text = None
 
         if check:
             text = (f"🚨 <b>New Update Found</b>\n\n"
-                    f"   🔹App Name: <code>{ap['app_name']}</code>\n"
-                    f"   🔹Registered Version: <code>{ap['current_version']}</code>\n"
+                    f"   🔹App Name: <code>{ap.app_name}</code>\n"
+                    f"   🔹Registered Version: <code>{ap.current_version}</code>\n"
                     f"   🔹New Version: {new_version}\n"
-                    f"   🔹Updated On: <code>{ap['last_update']}</code>\n\n"
+                    f"   🔹Updated On: <code>{ap.last_update_text}</code>\n\n"
                     f"🔸Scegli un'opzione") if new_version != 'Varies with device' else (
                 f"🚨 <b>New Update Found</b>\n\n"
-                f"   🔹App Name: <code>{ap['app_name']}</code>\n"
-                f"   🔹Registered Version: ⚠️ <code>{ap['current_version']}</code>\n"
+                f"   🔹App Name: <code>{ap.app_name}</code>\n"
+                f"   🔹Registered Version: ⚠️ <code>{ap.current_version}</code>\n"
                 f"   🔹New Version: {new_version}\n"
-                f"   🔹Updated On: <code>{ap['last_update']}</code>\n\n"
-                f"   ▪️Next Check: <code>{ap['next_check'].strftime('%d %B %Y – %H:%M:%S')}</code>\n\n"
+                f"   🔹Updated On: <code>{ap.last_update_text}</code>\n\n"
+                f"   ▪️Next Check: <code>{ap.next_check.strftime('%d %B %Y – %H:%M:%S')}</code>\n\n"
                 f"ℹ Potrebbe essere che l'aggiornamento non riguardi il client di interesse perché la versione"
                 f" dipende dal dispositivo.\n\n"
                 f"🔸Scegli un'opzione"
             )
 
             last_check = {
-                "time": ap["last_check"],
-                "app_name": ap["app_name"],
-                "current_version": ap["current_version"],
+                "time": ap.last_check,
+                "app_name": ap.app_name,
+                "current_version": ap.current_version,
                 "new_version": new_version,
                 "update_found": True
             }
 
-            ap["current_version"] = new_version
-            ap["last_update"] = update_date.strftime("%d %B %Y")
+            ap.current_version = new_version
+            ap.last_update = update_date
 
-        elif ap["send_on_check"]:
+        elif ap.send_on_check:
             text = (f"👁‍🗨 <b>Check Performed</b> – No Updates Found\n\n"
-                    f"   🔹App Name: <code>{ap['app_name']}</code>\n"
-                    f"   🔹Registered Version: <code>{ap['current_version']}</code>\n"
-                    f"   🔹Updated On: <code>{ap['last_update']}</code>\n"
-                    f"   ▪️Next Check: <code>{ap['next_check'].strftime('%d %B %Y – %H:%M:%S')}</code>\n\n"
+                    f"   🔹App Name: <code>{ap.app_name}</code>\n"
+                    f"   🔹Registered Version: <code>{ap.current_version}</code>\n"
+                    f"   🔹Updated On: <code>{ap.last_update_text}</code>\n"
+                    f"   ▪️Next Check: <code>{ap.next_check.strftime('%d %B %Y – %H:%M:%S')}</code>\n\n"
                     f"🔸Scegli un'opzione")
 
             last_check = {
-                "time": ap["last_check"],
-                "app_name": ap["app_name"],
-                "current_version": ap["current_version"],
+                "time": ap.last_check,
+                "app_name": ap.app_name,
+                "current_version": ap.current_version,
                 "update_found": False
             }
 
@@ -256,10 +316,12 @@ async def scheduled_app_check(context: ContextTypes.DEFAULT_TYPE):
             keyboard = [
                 [
                     InlineKeyboardButton(text="🪛 Imp. App", callback_data=f"edit_from_job {index}"),
-                    InlineKeyboardButton(text="🌐 Vai al Play Store", url=ap["app_link"])
+                    InlineKeyboardButton(text="🌐 Vai al Play Store", url=ap.app_link)
                 ],
                 [
-                    InlineKeyboardButton(text="⏸ Sospendi Controlli", callback_data=f"suspend_app {index}")
+                    InlineKeyboardButton(text="⏸ Sospendi Controlli", callback_data=f"suspend_app {index}"),
+                    InlineKeyboardButton(text=f"🧠 Adattivo: {'On' if (ap.adaptive or {}).get('enabled') else 'Off'}",
+                                         callback_data=f"toggle_adaptive {index}")
                 ],
                 [
                     InlineKeyboardButton(text="🗑 Cancella Messaggio",
@@ -274,58 +336,89 @@ async def scheduled_app_check(context: ContextTypes.DEFAULT_TYPE):
             job_queue_logger.info("No message is sent cause of app settings.")
 
 
-async def reschedule(ap: Application | ContextTypes.DEFAULT_TYPE, cd: dict, from_restore: bool):
-    # riprogramma i controlli ti TUTTE le app sulla base dei parametri specificati in cd
+@instrumented("scheduled_checks_tick")
+async def scheduled_checks_tick(context: ContextTypes.DEFAULT_TYPE):
+    # unico job ripetuto: estrae dall'heap tutte le app scadute e avvia i relativi controlli in parallelo
+    now = clock.now()
+    for chat_id, app_index, when in check_scheduler.pop_due(now):
+        if (cd := context.application.chat_data.get(chat_id)) is None or app_index not in cd.get("apps", {}):
+            continue
+        if (ap := cd["apps"][app_index]).suspended:
+            continue
+
+        check_scheduler.schedule(chat_id, app_index, now + effective_interval(ap))
+        context.application.create_task(scheduled_app_check(context, {
+            "app_id": ap.app_id,
+            "app_link": ap.app_link,
+            "app_index": app_index,
+            "chat_data": cd,
+            "scheduled_at": when
+        }), name=f"app_check_{chat_id}_{app_index}")
+
+
+def plan_catch_up(overdue: list[tuple[datetime.timedelta, int, int]],
+                  now: datetime.datetime) -> list[tuple[int, int, datetime.datetime]]:
+    """
+    Distribuisce i controlli arretrati (ritardo, chat_id, app_index) nella finestra di recupero: la finestra è
+    divisa in uno slot per app, le app più in ritardo prendono i primi slot e ognuna parte in un punto casuale
+    del proprio slot.
+    """
+    if not overdue:
+        return []
+    slot = CATCH_UP_WINDOW_SECONDS / len(overdue)
+    return [
+        (chat_id, app_index, now + datetime.timedelta(seconds=1 + n * slot + random.uniform(0, slot)))
+        for n, (_, chat_id, app_index) in enumerate(sorted(overdue, key=lambda o: o[0], reverse=True))
+    ]
+
+
+def schedule_catch_up(overdue: list[tuple[datetime.timedelta, int, int]]):
+    for chat_id, app_index, when in plan_catch_up(overdue, clock.now()):
+        check_scheduler.schedule(chat_id, app_index, when)
+
+
+def phase_jitter(interval: datetime.timedelta) -> datetime.timedelta:
+    # al massimo un decimo dell'intervallo, per non spostare troppo i controlli delle app con intervalli brevi
+    return datetime.timedelta(seconds=random.uniform(0, min(PHASE_JITTER_SECONDS, interval.total_seconds() / 10)))
+
+
+async def reschedule(ap: Application | ContextTypes.DEFAULT_TYPE, cd: dict, from_restore: bool,
+                     overdue: list | None = None):
+    """
+    Riprogramma i controlli di TUTTE le app sulla base dei parametri specificati in cd. Le app scadute vengono
+    aggiunte a 'overdue' (se passato) così che il chiamante possa pianificarne il recupero insieme a quelle delle
+    altre chat; altrimenti il recupero viene pianificato solo per questa chat.
+    """
     if "apps" in cd:
+        check_scheduler.cancel_chat(cd["chat_id"])
         li = []
+        now = clock.now()
+        chat_overdue = [] if overdue is None else overdue
         for a in cd["apps"]:
             i = cd["apps"][a]
-            for j in ap.job_queue.get_jobs_by_name(i["app_name"]):
-                j.schedule_removal()
+            # app salvate in un formato non convertibile (vedi 'app_record.upgrade_apps')
+            if not isinstance(i, AppRecord):
+                li.append(a)
+                continue
             try:
-                if i["next_check"] - datetime.datetime.now(pytz.timezone('Europe/Rome')) < datetime.timedelta(0):
+                if i.suspended:
+                    continue
+                if i.next_check - now < datetime.timedelta(0):
                     if not from_restore:
-                        ap.job_queue.run_once(callback=scheduled_app_check,
-                                              data={
-                                                  "app_id": i["app_id"],
-                                                  "app_link": i["app_link"],
-                                                  "app_index": a,
-                                                  "chat_data": cd
-                                              },
-                                              when=1,
-                                              name=i["app_name"])
-                    ap.job_queue.run_repeating(callback=scheduled_app_check,
-                                               interval=i["check_interval"]["timedelta"],
-                                               data={
-                                                   "app_id": i["app_id"],
-                                                   "app_link": i["app_link"],
-                                                   "app_index": a,
-                                                   "chat_data": cd
-                                               },
-                                               name=i["app_name"])
+                        chat_overdue.append((now - i.next_check, cd["chat_id"], a))
+                        continue
+                    when = now + effective_interval(i)
                 else:
-                    if not from_restore:
-                        ap.job_queue.run_once(callback=scheduled_app_check,
-                                              data={
-                                                  "app_id": i["app_id"],
-                                                  "app_link": i["app_link"],
-                                                  "app_index": a,
-                                                  "chat_data": cd
-                                              },
-                                              when=i["next_check"],
-                                              name=i["app_name"])
-                    ap.job_queue.run_repeating(callback=scheduled_app_check,
-                                               interval=i["check_interval"]["timedelta"],
-                                               data={
-                                                   "app_id": i["app_id"],
-                                                   "app_link": i["app_link"],
-                                                   "app_index": a,
-                                                   "chat_data": cd
-                                               },
-                                               first=i["next_check"] + i["check_interval"]["timedelta"],
-                                               name=i["app_name"])
-            except KeyError:
+                    when = i.next_check + (effective_interval(i) if from_restore
+                                           else datetime.timedelta(0))
+                check_scheduler.schedule(cd["chat_id"], a, when + phase_jitter(effective_interval(i)))
+            except TypeError:
                 li.append(a)
 
         for i in li:
             del cd["apps"][i]
+        if li:
+            app_indexes.invalidate(cd["chat_id"])
+
+        if overdue is None:
+            schedule_catch_up(chat_overdue)
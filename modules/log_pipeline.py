@@ -0,0 +1,158 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from logging import handlers
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# stesso messaggio (logger, livello, template) al massimo 'LOG_RATE_LIMIT_BURST' volte ogni
+# 'LOG_RATE_LIMIT_WINDOW' secondi; 0 disattiva il limite. Vale solo per i logger dei controlli e delle richieste al
+# Play Store, che ripetono lo stesso avviso per ogni app quando il Play Store ha problemi
+LOG_RATE_LIMIT_BURST = int(os.getenv("LOG_RATE_LIMIT_BURST", 5))
+LOG_RATE_LIMIT_WINDOW = float(os.getenv("LOG_RATE_LIMIT_WINDOW", 60))
+RATE_LIMITED_LOGGERS = ("job_queue_logger", "play_store_logger")
+# record prelevati al massimo dalla coda a ogni risveglio del thread di scrittura
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", 256))
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limita i messaggi ripetuti con lo stesso template (es. "Not Able to Get Link %s: %s" durante un problema del
+    Play Store): oltre il limite vengono scartati e il primo messaggio della finestra successiva riporta quanti
+    ne sono stati soppressi.
+    """
+
+    def __init__(self, burst: int, window: float):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._windows: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.burst <= 0:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            # [inizio finestra, messaggi emessi, messaggi soppressi]
+            if (w := self._windows.get(key)) is None or now - w[0] >= self.window:
+                suppressed = w[2] if w is not None else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} [{suppressed} messaggi uguali soppressi]"
+                if len(self._windows) > 4096:
+                    self._windows = {k: v for k, v in self._windows.items() if now - v[0] < self.window}
+                return True
+            if w[1] < self.burst:
+                w[1] += 1
+                return True
+            w[2] += 1
+            return False
+
+
+class DeferredQueueHandler(handlers.QueueHandler):
+    """
+    Sul thread chiamante viene solo risolto il messaggio (msg % args): data, formatter, traceback e scrittura su
+    file avvengono nel thread del listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class BatchQueueListener(handlers.QueueListener):
+    """
+    QueueListener che preleva dalla coda fino a 'batch_size' record alla volta e li consegna agli handler che
+    li avrebbero ricevuti seguendo la gerarchia dei logger. Scrittura e rotazione dei file restano agli handler
+    originali (RotatingFileHandler, ConcurrentRotatingFileHandler, ...).
+    """
+
+    def __init__(self, log_queue: queue.SimpleQueue, routes: dict[logging.Logger, list[logging.Handler]],
+                 batch_size: int):
+        super().__init__(log_queue)
+        self.routes = routes
+        self.batch_size = batch_size
+        self._chains: dict[str, list[logging.Handler]] = {}
+
+    def _chain(self, name: str) -> list[logging.Handler]:
+        # come 'Logger.callHandlers': handler del logger e dei suoi antenati finché 'propagate' è True
+        if (chain := self._chains.get(name)) is None:
+            chain = []
+            logger = logging.getLogger(name) if name != "root" else logging.root
+            while logger is not None:
+                chain += self.routes.get(logger, [])
+                logger = logger.parent if logger.propagate else None
+            self._chains[name] = chain
+        return chain
+
+    def _monitor(self):
+        q = self.queue
+        while True:
+            batch = [q.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            stop = self._sentinel in batch
+            self.write([r for r in batch if r is not self._sentinel])
+            if stop:
+                return
+
+    def write(self, records: list[logging.LogRecord]):
+        for record in records:
+            for handler in self._chain(record.name):
+                if record.levelno >= handler.level:
+                    # 'handle' gestisce filtri, lock ed errori; 'emit' la rotazione del file
+                    handler.handle(record)
+
+
+_listener: BatchQueueListener | None = None
+
+
+def start(rate_limit_burst: int = LOG_RATE_LIMIT_BURST, rate_limit_window: float = LOG_RATE_LIMIT_WINDOW):
+    """
+    Sposta gli handler di tutti i logger configurati (root compreso) in un unico thread di scrittura: ai logger
+    resta solo un DeferredQueueHandler, e a quelli in 'RATE_LIMITED_LOGGERS' il filtro sui messaggi ripetuti. Va
+    chiamata dopo aver configurato i logger dei moduli.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    loggers = [logging.root] + [logger for logger in logging.root.manager.loggerDict.values()
+                                if isinstance(logger, logging.Logger) and logger.handlers]
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    # filtro sul logger e non sull'handler: non si applica ai record degli altri logger che passano dal root
+    for name in RATE_LIMITED_LOGGERS:
+        logging.getLogger(name).addFilter(RateLimitFilter(rate_limit_burst, rate_limit_window))
+
+    routes = {}
+    for logger in loggers:
+        routes[logger] = list(logger.handlers)
+        for h in routes[logger]:
+            logger.removeHandler(h)
+    # la coda è solo sul root (ci arrivano tutti i record propagati) e sui logger che non propagano
+    for logger in [logging.root] + [logger for logger in loggers if not logger.propagate]:
+        logger.addHandler(queue_handler)
+
+    _listener = BatchQueueListener(log_queue, routes, LOG_BATCH_SIZE)
+    _listener.start()
+    atexit.register(stop)
+
+
+def stop():
+    # scrive i record ancora in coda e ferma il thread
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
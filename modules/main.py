@@ -9,14 +9,20 @@ from telegram.ext import (
     Application,
     CommandHandler,
     CallbackQueryHandler,
-    PicklePersistence,
     MessageHandler,
     filters,
     Defaults,
     TypeHandler
 )
 
+import log_pipeline
+import play_store
+from app_record import upgrade_apps
 import settings
+from instrumentation import instrumentation
+from profiler import (profile_cpu, profile_memory, ProfileBusyError, PROFILE_DEFAULT_SECONDS,
+                      PROFILE_MAX_SECONDS)
+from metrics import MetricsServer, MetricsRequest, TimedPicklePersistence, METRICS_HOST, METRICS_PORT
 import utils
 from decorators import send_action
 from modules.settings import set_user_permissions, manage_users_and_permissions
@@ -38,6 +44,9 @@ bot_logger.addHandler(file_handler)
 
 load_dotenv()
 
+# endpoint delle metriche, creato da 'main' solo se 'METRICS_PORT' è impostato
+metrics_server: MetricsServer | None = None
+
 
 # noinspection GrazieInspection
 async def set_bot_data(appl: Application) -> None:
@@ -108,11 +117,75 @@ async def set_bot_data(appl: Application) -> None:
             except KeyError:
                 raise KeyError("Missing 'max_backups' setting in first_boot.yml. Add it under 'settings' section")
 
+    instrumentation.start_probe()
+    if metrics_server is not None:
+        await metrics_server.start()
+    appl.job_queue.run_repeating(callback=job_queue.scheduled_checks_tick,
+                                 interval=float(os.getenv("CHECK_TICK_SECONDS", 1)),
+                                 name="scheduled_checks_tick")
+
     # class of app.chat_data: mappingproxy(defaultdict(<class 'dict'>, {}))
+    # i controlli arretrati di tutte le chat vengono raccolti e distribuiti insieme nella finestra di recupero
+    overdue = []
     # noinspection PyUnresolvedReferences
     for cd in appl.chat_data:
+        # app salvate come dict dalle versioni precedenti
         # noinspection PyUnresolvedReferences
-        await job_queue.reschedule(appl, appl.chat_data[cd], False)
+        upgrade_apps(appl.chat_data[cd])
+        # noinspection PyUnresolvedReferences
+        await job_queue.reschedule(appl, appl.chat_data[cd], False, overdue)
+    job_queue.schedule_catch_up(overdue)
+
+
+async def close_resources(appl: Application) -> None:
+    await play_store.close_client()
+    await instrumentation.stop_probe()
+    if metrics_server is not None:
+        await metrics_server.stop()
+    instrumentation.dump()
+
+
+async def job_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # solo per l'owner: riepilogo di ritardi / durate dei job e lag dell'event loop, più il dump completo
+    if not await settings.is_owner(context, update.effective_user.id):
+        return
+
+    path = instrumentation.dump()
+    await send_message_with_typing_action(data={
+        "chat_id": update.effective_chat.id,
+        "text": instrumentation.summary_text(),
+        "file_path": path,
+        "keyboard": [[InlineKeyboardButton(text="🗑 Cancella Messaggio", callback_data="delete_message {}")]],
+        "close_button": [1, 1]
+    }, context=context)
+
+
+async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # solo per l'owner: '/profile [secondi] [mem]' profila l'event loop (CPU o memoria) e invia i risultati
+    if not await settings.is_owner(context, update.effective_user.id):
+        return
+
+    args = context.args or []
+    memory = "mem" in args
+    seconds = next((float(a) for a in args if a.replace(".", "", 1).isdigit()), PROFILE_DEFAULT_SECONDS)
+    seconds = min(max(seconds, 1), PROFILE_MAX_SECONDS)
+    await context.bot.send_message(chat_id=update.effective_chat.id,
+                                   text=f"⏱ Profilazione {'memoria' if memory else 'CPU'} per {seconds:g}s in corso...")
+    try:
+        path, summary = await (profile_memory if memory else profile_cpu)(seconds)
+    except ProfileBusyError:
+        await context.bot.send_message(chat_id=update.effective_chat.id,
+                                       text="⚠️ C'è già una profilazione in corso.")
+        return
+
+    bot_logger.info(f"Profile completed: {summary}")
+    await send_message_with_typing_action(data={
+        "chat_id": update.effective_chat.id,
+        "text": f"✅ <b>Profilazione completata</b>\n\n<code>{summary}</code>",
+        "file_path": path,
+        "keyboard": [[InlineKeyboardButton(text="🗑 Cancella Messaggio", callback_data="delete_message {}")]],
+        "close_button": [1, 1]
+    }, context=context)
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -239,15 +312,33 @@ async def catch_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
             print("...but it's not.")
 
 
-def main():
+def build_application() -> Application:
+    """
+    Crea l'applicazione con persistenza, hook di avvio / chiusura e tutti gli handler, senza avviarla: usata da
+    'main' e dai benchmark (vedi 'bench/e2e_benchmark.py').
+    """
+    # da qui in poi formattazione e scrittura dei log avvengono in un thread separato (vedi 'log_pipeline')
+    log_pipeline.start()
+
     # if os.path.exists("config/persistence"):
     #     os.remove("config/persistence")
     #     print("\n\ni  Persistence file removed\n\n")
 
-    persistence = PicklePersistence(filepath="config/persistence")
-    appl = (ApplicationBuilder().token(os.getenv("BOT_TOKEN")).persistence(persistence).
-            defaults(Defaults(tzinfo=pytz.timezone('Europe/Rome'))).
-            post_init(set_bot_data).arbitrary_callback_data(True).build())
+    persistence = TimedPicklePersistence(filepath="config/persistence")
+    # passando una request personalizzata si perde il default dell'ApplicationBuilder (256 connessioni; un
+    # HTTPXRequest creato a mano ne avrebbe 1): lo si riporta qui per non cambiare il pool verso la Bot API
+    builder = (ApplicationBuilder().token(os.getenv("BOT_TOKEN")).persistence(persistence).
+               request(MetricsRequest(connection_pool_size=256)).
+               defaults(Defaults(tzinfo=pytz.timezone('Europe/Rome'))).
+               post_init(set_bot_data).post_shutdown(close_resources).arbitrary_callback_data(True))
+
+    # permette di puntare il bot verso una Bot API diversa da quella ufficiale (es. 'bench/fake_bot_api.py')
+    if base_url := os.getenv("BOT_API_BASE_URL"):
+        builder.base_url(base_url)
+    if base_file_url := os.getenv("BOT_API_BASE_FILE_URL"):
+        builder.base_file_url(base_file_url)
+
+    appl = builder.build()
 
     conv_handler1 = ConversationHandler(
         entry_points=[
@@ -526,12 +617,25 @@ def main():
     appl.add_handler(conv_handler1)
     appl.add_handler(conv_handler2)
 
+    appl.add_handler(CommandHandler("stats", job_stats))
+    # non bloccante: gli altri update vengono gestiti (e profilati) mentre la profilazione è in corso
+    appl.add_handler(CommandHandler("profile", profile, block=False))
+
     appl.add_handler(CallbackQueryHandler(pattern="^suspend_app.+$", callback=settings.suspend_app))
+    appl.add_handler(CallbackQueryHandler(pattern="^toggle_adaptive.+$", callback=settings.toggle_adaptive))
     appl.add_handler(CallbackQueryHandler(pattern="^delete_message.+$",
                                           callback=settings.delete_extemporary_message))
     appl.add_handler(CallbackQueryHandler(pattern="^edit_from_job.+$", callback=settings.see_app_settings))
     appl.add_handler(set_app_conv_handler)
 
+    return appl
+
+
+def main():
+    global metrics_server
+    appl = build_application()
+    if METRICS_PORT is not None:
+        metrics_server = MetricsServer(appl, METRICS_HOST, METRICS_PORT)
     appl.run_polling()
 
 
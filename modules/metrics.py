@@ -0,0 +1,261 @@
+import asyncio
+import os
+import time
+from collections import defaultdict
+from typing import Awaitable
+
+from dotenv import load_dotenv
+from telegram.ext import Application, PicklePersistence
+from telegram.request import HTTPXRequest
+
+import play_store
+from check_scheduler import check_scheduler
+from instrumentation import Histogram, BUCKETS, instrumentation
+
+import logging
+from logging import handlers
+
+metrics_logger = logging.getLogger("metrics_logger")
+metrics_logger.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+file_handler = handlers.RotatingFileHandler(filename="logs/metrics.log",
+                                            maxBytes=1024*1024*10, backupCount=1)
+file_handler.setFormatter(formatter)
+metrics_logger.addHandler(file_handler)
+
+load_dotenv()
+
+# endpoint attivo solo se 'METRICS_PORT' è impostato; di default ascolta solo in locale
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(port) if (port := os.getenv("METRICS_PORT")) else None
+PREFIX = "playchecker_"
+
+HELP = {
+    "checks_total": ("counter", "Controlli eseguiti"),
+    "updates_found_total": ("counter", "Nuove versioni trovate"),
+    "fetch_errors_total": ("counter", "Controlli falliti per tipo di errore"),
+    "check_fetch_seconds": ("histogram", "Tempo per ottenere i dettagli di un'app (cache compresa)"),
+    "scheduled_messages_total": ("counter", "Messaggi programmati con send_message_with_typing_action"),
+    "telegram_api_calls_total": ("counter", "Chiamate alla Bot API per metodo"),
+    "telegram_api_flood_limited_total": ("counter", "Risposte 429 della Bot API per metodo"),
+    "persistence_write_seconds": ("histogram", "Durata dei salvataggi della persistenza (scrittura del file compresa)"),
+}
+
+
+class Metrics:
+    """
+    Contatori e istogrammi alimentati dagli hook (job_queue, utils, persistenza, richieste alla Bot API); le altre
+    metriche vengono lette al momento dello scrape dalle statistiche già esistenti (play_store, check_scheduler,
+    instrumentation).
+    """
+
+    def __init__(self):
+        self.counters: dict[str, dict[tuple, float]] = defaultdict(lambda: defaultdict(float))
+        self.histograms: dict[str, dict[tuple, Histogram]] = defaultdict(dict)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        self.counters[name][tuple(sorted(labels.items()))] += amount
+
+    def observe(self, name: str, value: float, **labels):
+        if (h := self.histograms[name].get(key := tuple(sorted(labels.items())))) is None:
+            h = self.histograms[name][key] = Histogram()
+        h.observe(value)
+
+
+metrics = Metrics()
+
+
+def _labels(labels: tuple | dict) -> str:
+    items = labels.items() if isinstance(labels, dict) else labels
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+def _histogram(lines: list, name: str, h: Histogram, labels: tuple = ()):
+    cumulative = 0
+    for bound, n in zip(BUCKETS + ["+Inf"], h.counts):
+        cumulative += n
+        lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+    lines.append(f"{name}_sum{_labels(labels)} {h.total}")
+    lines.append(f"{name}_count{_labels(labels)} {h.count}")
+
+
+def _gauge(lines: list, name: str, help_text: str, values: dict[tuple, float] | float, kind: str = "gauge"):
+    lines.append(f"# HELP {PREFIX}{name} {help_text}")
+    lines.append(f"# TYPE {PREFIX}{name} {kind}")
+    for labels, value in (values.items() if isinstance(values, dict) else [((), values)]):
+        lines.append(f"{PREFIX}{name}{_labels(labels)} {value}")
+
+
+class BackupSizes:
+    """
+    Numero e dimensione totale dei file di backup: calcolati alla prima lettura e ricalcolati con 'refresh' da chi
+    crea o cancella i backup, così lo scrape non scorre la cartella sull'event loop.
+    """
+
+    def __init__(self, path: str = "backups"):
+        self.path = path
+        self._sizes: tuple[int, int] | None = None
+
+    def refresh(self):
+        count = size = 0
+        for root, _, files in os.walk(self.path):
+            for f in files:
+                count += 1
+                size += os.path.getsize(os.path.join(root, f))
+        self._sizes = (count, size)
+
+    def get(self) -> tuple[int, int]:
+        if self._sizes is None:
+            self.refresh()
+        return self._sizes
+
+
+backup_sizes = BackupSizes()
+
+
+def render(appl: Application) -> str:
+    lines = []
+    for name, (kind, help_text) in HELP.items():
+        lines.append(f"# HELP {PREFIX}{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}{name} {kind}")
+        if kind == "counter":
+            for labels, value in metrics.counters.get(name, {}).items():
+                lines.append(f"{PREFIX}{name}{_labels(labels)} {value}")
+        else:
+            for labels, h in metrics.histograms.get(name, {}).items():
+                _histogram(lines, PREFIX + name, h, labels)
+
+    cache = play_store.details_cache.stats()
+    pool = play_store.fetch_pool.stats()
+    _gauge(lines, "cache_hit_ratio", "Rapporto di hit della cache dei dettagli", cache["hit_ratio"])
+    _gauge(lines, "cache_lookups_total", "Accessi alla cache dei dettagli per esito",
+           {(("result", k),): cache[k] for k in ("hits", "misses", "coalesced")}, "counter")
+    _gauge(lines, "fetch_pool_requests_total", "Richieste HTTP verso il Play Store", pool["requests"], "counter")
+    _gauge(lines, "fetch_pool_queue_depth", "Richieste in attesa nel fetch pool", pool["queue_depth"])
+    _gauge(lines, "fetch_pool_active", "Richieste in corso nel fetch pool", pool["active"])
+    _gauge(lines, "fetch_pool_wait_seconds_total", "Tempo totale di attesa in coda nel fetch pool",
+           pool["total_wait"], "counter")
+    _gauge(lines, "fetch_deadline_exceeded_total", "Richieste oltre 'PLAY_FETCH_DEADLINE' (attesa in coda esclusa)",
+           pool["deadline_exceeded"], "counter")
+    _gauge(lines, "fetch_retries_total", "Tentativi ripetuti dalla retry policy",
+           play_store.retry_policy.stats()["retries"], "counter")
+    _gauge(lines, "circuit_open", "1 se il circuit breaker dell'host non è chiuso",
+           {(("host", host),): int(b["state"] != "closed") for host, b in pool["breakers"].items()})
+
+    _gauge(lines, "ptb_jobs", "Job presenti nel JobQueue di PTB", len(appl.job_queue.jobs()))
+    _gauge(lines, "scheduled_checks", "App in attesa nell'heap dei controlli", len(check_scheduler))
+    _gauge(lines, "scheduled_checks_by_chat", "App in attesa nell'heap dei controlli per chat",
+           {(("chat", chat_id),): n for chat_id, n in check_scheduler.counts().items()})
+
+    _gauge(lines, "persistence_bytes", "Dimensione del file di persistenza",
+           os.path.getsize("config/persistence") if os.path.isfile("config/persistence") else 0)
+    count, size = backup_sizes.get()
+    _gauge(lines, "backup_files", "File di backup presenti", count)
+    _gauge(lines, "backup_bytes", "Dimensione totale dei backup", size)
+
+    lines.append(f"# HELP {PREFIX}loop_lag_seconds Lag dell'event loop misurato dal probe")
+    lines.append(f"# TYPE {PREFIX}loop_lag_seconds histogram")
+    _histogram(lines, f"{PREFIX}loop_lag_seconds", instrumentation.loop_lag)
+    for metric, attr, help_text in (("job_lateness_seconds", "lateness", "Ritardo delle callback del JobQueue"),
+                                    ("job_duration_seconds", "duration", "Durata delle callback del JobQueue")):
+        lines.append(f"# HELP {PREFIX}{metric} {help_text}")
+        lines.append(f"# TYPE {PREFIX}{metric} histogram")
+        for name, stats in instrumentation.jobs.items():
+            _histogram(lines, PREFIX + metric, getattr(stats, attr), (("job", name),))
+    return "\n".join(lines) + "\n"
+
+
+class MetricsRequest(HTTPXRequest):
+    """
+    Richieste alla Bot API conteggiate per metodo (e per risposte 429).
+    """
+
+    async def do_request(self, url: str, method: str, *args, **kwargs) -> tuple[int, bytes]:
+        code, payload = await super().do_request(url, method, *args, **kwargs)
+        api_method = url.rsplit("/", 1)[-1]
+        metrics.inc("telegram_api_calls_total", method=api_method)
+        if code == 429:
+            metrics.inc("telegram_api_flood_limited_total", method=api_method)
+        return code, payload
+
+
+class TimedPicklePersistence(PicklePersistence):
+    """
+    PicklePersistence che misura i metodi pubblici con cui PTB salva i dati: la scrittura del file avviene al loro
+    interno, in modo sincrono sull'event loop.
+    """
+
+    @staticmethod
+    async def _timed(method: str, call: Awaitable):
+        start = time.perf_counter()
+        try:
+            return await call
+        finally:
+            metrics.observe("persistence_write_seconds", time.perf_counter() - start, method=method)
+
+    async def update_bot_data(self, data) -> None:
+        await self._timed("update_bot_data", super().update_bot_data(data))
+
+    async def update_chat_data(self, chat_id: int, data) -> None:
+        await self._timed("update_chat_data", super().update_chat_data(chat_id, data))
+
+    async def update_user_data(self, user_id: int, data) -> None:
+        await self._timed("update_user_data", super().update_user_data(user_id, data))
+
+    async def update_callback_data(self, data) -> None:
+        await self._timed("update_callback_data", super().update_callback_data(data))
+
+    async def update_conversation(self, name: str, key: tuple, new_state: object | None) -> None:
+        await self._timed("update_conversation", super().update_conversation(name, key, new_state))
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        await self._timed("drop_chat_data", super().drop_chat_data(chat_id))
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await self._timed("drop_user_data", super().drop_user_data(user_id))
+
+    async def flush(self) -> None:
+        await self._timed("flush", super().flush())
+
+
+class MetricsServer:
+    """
+    Endpoint HTTP minimo (solo 'GET /metrics') servito dallo stesso event loop del bot.
+    """
+
+    def __init__(self, appl: Application, host: str, port: int):
+        self.appl = appl
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+            path = request.split(b" ", 2)[1].decode() if request.count(b" ") >= 2 else ""
+            if path.split("?")[0] == "/metrics":
+                status, body = "200 OK", render(self.appl).encode()
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            metrics_logger.error(f"Error while serving metrics: {e!r}")
+        finally:
+            writer.close()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        metrics_logger.info(f"Metrics endpoint on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
@@ -0,0 +1,677 @@
+import asyncio
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections import deque
+from contextvars import ContextVar
+from logging import handlers
+from urllib.parse import urlsplit
+
+import httpx
+from cachetools import LRUCache, TTLCache
+from dotenv import load_dotenv
+from google_play_scraper.constants.regex import Regex
+from google_play_scraper.constants import request as play_request
+from google_play_scraper.constants.request import Formats
+from google_play_scraper.exceptions import NotFoundError, ExtraHTTPError
+from google_play_scraper.features.app import parse_dom
+from google_play_scraper.utils import nested_lookup
+
+play_store_logger = logging.getLogger("play_store_logger")
+play_store_logger.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+file_handler = handlers.RotatingFileHandler(filename="logs/play_store.log",
+                                            maxBytes=1024 * 1024 * 10, backupCount=1)
+file_handler.setFormatter(formatter)
+play_store_logger.addHandler(file_handler)
+
+load_dotenv()
+
+# permette di puntare il bot verso un Play Store finto (vedi 'bench/fake_play_store.py') per test e benchmark
+PLAY_STORE_BASE_URL = os.getenv("PLAY_STORE_BASE_URL", play_request.PLAY_STORE_BASE_URL).rstrip("/")
+
+# timeout di ogni singola fase di una richiesta, tempo massimo di una richiesta dal momento in cui parte e tempo
+# massimo complessivo di un controllo (richieste duplicate, fallback, tentativi, attese tra un tentativo e l'altro).
+# Il tempo del controllo parte quando la sua prima richiesta esce dalla coda del FetchPool: l'attesa iniziale dipende
+# dal carico ed è conteggiata a parte in 'FetchPool.total_wait'
+PLAY_TIMEOUT = httpx.Timeout(connect=float(os.getenv("PLAY_CONNECT_TIMEOUT", 5)),
+                             read=float(os.getenv("PLAY_READ_TIMEOUT", 10)),
+                             write=float(os.getenv("PLAY_WRITE_TIMEOUT", 5)),
+                             pool=float(os.getenv("PLAY_POOL_TIMEOUT", 5)))
+PLAY_FETCH_DEADLINE = float(os.getenv("PLAY_FETCH_DEADLINE", 20))
+PLAY_CHECK_DEADLINE = float(os.getenv("PLAY_CHECK_DEADLINE", 60))
+
+# tempo massimo del controllo in corso (vedi 'fetch'), avviato da 'FetchPool.get'
+_check_deadline: ContextVar[asyncio.Timeout | None] = ContextVar("check_deadline", default=None)
+
+# client HTTP condiviso: connessioni keep-alive riusate tra i controlli e HTTP/2 se richiesto e se il pacchetto
+# 'h2' è installato (pip install httpx[http2]); gzip/deflate (e brotli, se installato) sono negoziati da httpx
+PLAY_POOL_MAX_CONNECTIONS = int(os.getenv("PLAY_POOL_MAX_CONNECTIONS", 20))
+PLAY_POOL_MAX_KEEPALIVE = int(os.getenv("PLAY_POOL_MAX_KEEPALIVE", 10))
+PLAY_POOL_KEEPALIVE_EXPIRY = float(os.getenv("PLAY_POOL_KEEPALIVE_EXPIRY", 60))
+PLAY_HTTP2 = (os.getenv("PLAY_HTTP2", "True").lower() in ("1", "true", "yes") and
+              importlib.util.find_spec("h2") is not None)
+
+# richieste "hedged": se la risposta tarda oltre il p95 delle latenze osservate, ne parte una seconda identica e
+# si tiene la prima che arriva
+PLAY_HEDGE_REQUESTS = os.getenv("PLAY_HEDGE_REQUESTS", "False").lower() in ("1", "true", "yes")
+PLAY_HEDGE_DEFAULT_DELAY = float(os.getenv("PLAY_HEDGE_DEFAULT_DELAY", 2))
+PLAY_HEDGE_MIN_SAMPLES = 20
+
+# tentativi per ogni controllo (errori di rete, 429 e 5xx) con attesa esponenziale e jitter tra uno e l'altro
+PLAY_RETRY_ATTEMPTS = int(os.getenv("PLAY_RETRY_ATTEMPTS", 3))
+PLAY_RETRY_BASE_DELAY = float(os.getenv("PLAY_RETRY_BASE_DELAY", 0.5))
+PLAY_RETRY_MAX_DELAY = float(os.getenv("PLAY_RETRY_MAX_DELAY", 8))
+
+# il circuit breaker di un host si apre dopo 'PLAY_BREAKER_FAILURES' errori consecutivi (o subito con un 429) e
+# dopo 'PLAY_BREAKER_RESET' secondi lascia passare una sola richiesta di prova
+PLAY_BREAKER_FAILURES = int(os.getenv("PLAY_BREAKER_FAILURES", 5))
+PLAY_BREAKER_RESET = float(os.getenv("PLAY_BREAKER_RESET", 60))
+
+
+class FetchResult:
+    """
+    Esito di un singolo controllo: con un'unica richiesta HTTP vengono ricavati sia lo stato della pagina che i
+    dettagli dell'app (se la pagina è stata scaricata correttamente).
+    """
+
+    def __init__(self, app_id: str, url: str, status_code: int | None, reason: str,
+                 details: dict | None = None, error: Exception | None = None, unchanged: bool = False):
+        self.app_id = app_id
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        self.details = details
+        self.error = error
+        # True se la pagina non è cambiata dall'ultimo download e 'details' è quello già estratto allora
+        self.unchanged = unchanged
+
+    def ok(self) -> bool:
+        return self.details is not None
+
+    def not_found(self) -> bool:
+        return isinstance(self.error, NotFoundError)
+
+    def __repr__(self):
+        return (f'FetchResult(app_id={self.app_id}, status_code={self.status_code}, reason={self.reason}, '
+                f'ok={self.ok()})')
+
+
+class TokenBucket:
+    """
+    Limita il ritmo delle richieste verso un host: 'rate' gettoni al secondo, accumulabili fino a 'capacity'.
+    Chi attende viene servito in ordine di arrivo.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker di un singolo host. 'closed': le richieste passano; 'open': vengono rifiutate subito;
+    'half_open': trascorso 'reset_timeout', passa una sola richiesta di prova che decide se richiudere o riaprire.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, host: str, failure_threshold: int, reset_timeout: float):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+        self.transitions = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def _transition(self, state: str):
+        play_store_logger.warning(f"Circuit breaker for '{self.host}': {self.state} -> {state}")
+        self.state = state
+        self.transitions += 1
+        if state == CircuitBreaker.OPEN:
+            self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == CircuitBreaker.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._transition(CircuitBreaker.HALF_OPEN)
+        if self.state == CircuitBreaker.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        if self.state == CircuitBreaker.CLOSED:
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        if self.state != CircuitBreaker.CLOSED:
+            self._transition(CircuitBreaker.CLOSED)
+
+    def record_failure(self, rate_limited: bool = False):
+        self.failures += 1
+        if self.state == CircuitBreaker.OPEN:
+            # esito di una richiesta partita prima dell'apertura: il circuito è già aperto
+            return
+        if (self.state == CircuitBreaker.HALF_OPEN or rate_limited or
+                (self.state == CircuitBreaker.CLOSED and self.failures >= self.failure_threshold)):
+            self._transition(CircuitBreaker.OPEN)
+
+    def release_probe(self):
+        # la richiesta di prova è stata annullata prima di avere un esito: ne potrà partire un'altra
+        self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "transitions": self.transitions,
+            "rejected": self.rejected
+        }
+
+
+class FetchPool:
+    """
+    Tutte le richieste verso il Play Store passano da qui: al massimo 'concurrency' richieste contemporanee e,
+    per ogni host, un TokenBucket che ne limita il ritmo e un CircuitBreaker. Tiene traccia della coda e dei
+    tempi di attesa.
+    """
+
+    def __init__(self, concurrency: int, rate: float, burst: float):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._buckets: dict[str, TokenBucket] = {}
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self.waiting = 0
+        self.active = 0
+        self.requests = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.hedged = 0
+        self.deadline_exceeded = 0
+        self._latencies = deque(maxlen=200)
+
+    def _bucket(self, host: str) -> TokenBucket:
+        if (bucket := self._buckets.get(host)) is None:
+            bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        if (breaker := self._breakers.get(host)) is None:
+            breaker = self._breakers[host] = CircuitBreaker(host, PLAY_BREAKER_FAILURES, PLAY_BREAKER_RESET)
+        return breaker
+
+    async def get(self, client: httpx.AsyncClient, url: str, headers: dict | None = None) -> httpx.Response:
+        breaker = self.breaker(host := urlsplit(url).netloc)
+        queued_at = time.monotonic()
+        self.waiting += 1
+        started = False
+        allowed = False
+        recorded = False
+        try:
+            async with self._semaphore:
+                await self._bucket(host).acquire()
+                started = True
+                self.waiting -= 1
+                # il circuito va controllato all'uscita dalla coda: può essersi aperto durante l'attesa
+                if not (allowed := breaker.allow()):
+                    raise CircuitOpenError(f"Circuit open for '{host}'")
+                if (deadline := _check_deadline.get()) is not None and deadline.when() is None:
+                    deadline.reschedule(asyncio.get_running_loop().time() + PLAY_CHECK_DEADLINE)
+                waited = time.monotonic() - queued_at
+                self.requests += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+                self.active += 1
+                try:
+                    async with asyncio.timeout(PLAY_FETCH_DEADLINE):
+                        res = await client.get(url, headers=headers)
+                except TimeoutError:
+                    self.deadline_exceeded += 1
+                    recorded = True
+                    breaker.record_failure()
+                    raise
+                except httpx.HTTPError:
+                    recorded = True
+                    breaker.record_failure()
+                    raise
+                finally:
+                    self.active -= 1
+                self._latencies.append(time.monotonic() - queued_at - waited)
+                recorded = True
+                if res.status_code == 429 or res.status_code >= 500:
+                    breaker.record_failure(rate_limited=res.status_code == 429)
+                else:
+                    breaker.record_success()
+                return res
+        finally:
+            if not started:
+                self.waiting -= 1
+            if allowed and not recorded:
+                breaker.release_probe()
+
+    def latency_p95(self) -> float | None:
+        if len(self._latencies) < PLAY_HEDGE_MIN_SAMPLES:
+            return None
+        return sorted(self._latencies)[int(len(self._latencies) * 0.95) - 1]
+
+    async def hedged_get(self, client: httpx.AsyncClient, url: str, headers: dict | None = None) -> httpx.Response:
+        """
+        Come 'get', ma se la risposta non arriva entro il p95 delle latenze recenti invia una seconda richiesta
+        identica e restituisce la prima risposta valida; l'altra viene annullata.
+        """
+        if not PLAY_HEDGE_REQUESTS:
+            return await self.get(client, url, headers)
+
+        delay = p95 if (p95 := self.latency_p95()) is not None else PLAY_HEDGE_DEFAULT_DELAY
+        pending = {asyncio.create_task(self.get(client, url, headers))}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                self.hedged += 1
+                pending.add(asyncio.create_task(self.get(client, url, headers)))
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "queue_depth": self.waiting,
+            "active": self.active,
+            "requests": self.requests,
+            "total_wait": self.total_wait,
+            "avg_wait": self.total_wait / self.requests if self.requests else 0.0,
+            "max_wait": self.max_wait,
+            "latency_p95": self.latency_p95(),
+            "hedged": self.hedged,
+            "deadline_exceeded": self.deadline_exceeded,
+            "breakers": {host: breaker.stats() for host, breaker in self._breakers.items()}
+        }
+
+
+fetch_pool = FetchPool(concurrency=int(os.getenv("PLAY_FETCH_CONCURRENCY", 8)),
+                       rate=float(os.getenv("PLAY_RATE_PER_SECOND", 2)),
+                       burst=float(os.getenv("PLAY_RATE_BURST", 5)))
+
+
+# Il blocco dati con i dettagli dell'app: è l'unico che serve per i controlli
+DETAILS_SECTION = re.compile(r"AF_initDataCallback\(\{key: 'ds:5'[\s\S]*?</script")
+
+# Campi letti dall'estrattore minimo, con lo stesso percorso usato da 'ElementSpecs.Detail' dentro 'ds:5'
+DETAILS_FIELDS = {
+    "title": [1, 2, 0, 0],
+    "version": [1, 2, 140, 0, 0, 0],
+    "lastUpdatedOn": [1, 2, 145, 0, 0]
+}
+
+
+def details_section(dom: str) -> str | None:
+    return match.group(0) if (match := DETAILS_SECTION.search(dom)) else None
+
+
+def extract_details(section: str | None, app_id: str, url: str) -> dict | None:
+    """
+    Estrae dalla sola sezione 'ds:5' i campi usati dal bot (title, version, lastUpdatedOn), senza decodificare
+    gli altri blocchi della pagina. Restituisce None se la sezione manca o non ha la forma attesa.
+    """
+    if section is None or not (value := Regex.VALUE.findall(section)):
+        return None
+    try:
+        dataset = json.loads(value[0])
+    except ValueError:
+        return None
+
+    details = {field: _lookup(dataset, path) for field, path in DETAILS_FIELDS.items()}
+    if details["title"] is None or details["lastUpdatedOn"] is None:
+        return None
+    if details["version"] is None:
+        details["version"] = "Varies with device"
+    details["appId"] = app_id
+    details["url"] = url
+    return details
+
+
+def _lookup(source, path: list):
+    try:
+        return nested_lookup(source, path)
+    except (IndexError, KeyError):
+        return None
+
+
+async def parse_details(dom: str, section: str | None, app_id: str, url: str) -> dict:
+    """
+    Usa l'estrattore minimo e, se fallisce (es. il Play Store ha cambiato struttura), ripiega sul parsing completo
+    di 'google_play_scraper'.
+    """
+    if (details := extract_details(section, app_id, url)) is not None:
+        return details
+    play_store_logger.warning("Minimal extraction failed for '%s', falling back to full parsing", app_id)
+    return await asyncio.to_thread(parse_dom, dom, app_id, url)
+
+
+class ChangeDetector:
+    """
+    Ricorda, per ogni app, i validatori dell'ultima pagina scaricata: ETag / Last-Modified se il Play Store li
+    manda, altrimenti un hash del blocco dati con i dettagli dell'app ('ds:5'). Se la pagina non è cambiata,
+    vengono riusati i dettagli già estratti e il parsing completo viene saltato.
+    """
+
+    def __init__(self, maxsize: int):
+        self._validators = LRUCache(maxsize=maxsize)
+        self.not_modified = 0
+        self.same_digest = 0
+        self.changed = 0
+        self.refetched = 0
+
+    def tracks(self, app_id: str) -> bool:
+        return app_id in self._validators
+
+    def conditional_headers(self, app_id: str) -> dict:
+        if (v := self._validators.get(app_id)) is None:
+            return {}
+        headers = {}
+        if v["etag"]:
+            headers["If-None-Match"] = v["etag"]
+        if v["last_modified"]:
+            headers["If-Modified-Since"] = v["last_modified"]
+        return headers
+
+    @staticmethod
+    def digest(dom: str, section: str | None) -> str:
+        return hashlib.blake2b((section if section is not None else dom).encode(), digest_size=16).hexdigest()
+
+    def unchanged_details(self, app_id: str, res: httpx.Response, digest: str | None) -> dict | None:
+        if (v := self._validators.get(app_id)) is None:
+            return None
+        if res.status_code == 304:
+            self.not_modified += 1
+            return v["details"]
+        if digest is not None and digest == v["digest"]:
+            self.same_digest += 1
+            v["etag"] = res.headers.get("ETag")
+            v["last_modified"] = res.headers.get("Last-Modified")
+            return v["details"]
+        return None
+
+    def remember(self, app_id: str, res: httpx.Response, digest: str, details: dict):
+        self.changed += 1
+        self._validators[app_id] = {
+            "etag": res.headers.get("ETag"),
+            "last_modified": res.headers.get("Last-Modified"),
+            "digest": digest,
+            "details": details
+        }
+
+    def stats(self) -> dict:
+        return {
+            "not_modified": self.not_modified,
+            "same_digest": self.same_digest,
+            "changed": self.changed,
+            "refetched": self.refetched,
+            "tracked": len(self._validators)
+        }
+
+
+change_detector = ChangeDetector(maxsize=int(os.getenv("PLAY_CACHE_MAXSIZE", 1024)))
+
+
+def detail_url(app_id: str, lang: str, country: str) -> str:
+    url = Formats.Detail.build(app_id=app_id, lang=lang, country=country)
+    return PLAY_STORE_BASE_URL + url.removeprefix(play_request.PLAY_STORE_BASE_URL)
+
+
+def fallback_url(app_id: str, lang: str) -> str:
+    url = Formats.Detail.fallback_build(app_id=app_id, lang=lang)
+    return PLAY_STORE_BASE_URL + url.removeprefix(play_request.PLAY_STORE_BASE_URL)
+
+
+_client: httpx.AsyncClient | None = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Restituisce il client condiviso da tutte le richieste verso il Play Store, creandolo al primo utilizzo.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=PLAY_TIMEOUT,
+            http2=PLAY_HTTP2,
+            limits=httpx.Limits(max_connections=PLAY_POOL_MAX_CONNECTIONS,
+                                max_keepalive_connections=PLAY_POOL_MAX_KEEPALIVE,
+                                keepalive_expiry=PLAY_POOL_KEEPALIVE_EXPIRY)
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def _get_page(client: httpx.AsyncClient, app_id: str, lang: str, country: str) -> tuple[str, httpx.Response]:
+    url = detail_url(app_id, lang, country)
+    res = await fetch_pool.hedged_get(client, url, headers=change_detector.conditional_headers(app_id))
+    if res.status_code == 304 and not change_detector.tracks(app_id):
+        # validatori rimossi dall'LRU mentre la richiesta era in corso: senza i dettagli salvati un 304 non basta
+        change_detector.refetched += 1
+        res = await fetch_pool.hedged_get(client, url)
+    if res.status_code == 404:
+        url = fallback_url(app_id, lang)
+        res = await fetch_pool.hedged_get(client, url)
+    return url, res
+
+
+class RetryPolicy:
+    """
+    Attesa esponenziale con jitter ("full jitter") tra un tentativo e l'altro: al tentativo n si attende un tempo
+    casuale tra 0 e min(max_delay, base_delay * 2^n).
+    """
+
+    def __init__(self, attempts: int, base_delay: float, max_delay: float):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self.exhausted = 0
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    @staticmethod
+    def retryable(res: httpx.Response) -> bool:
+        return res.status_code == 429 or res.status_code >= 500
+
+    async def get_page(self, client: httpx.AsyncClient, app_id: str, lang: str,
+                       country: str) -> tuple[str, httpx.Response]:
+        for attempt in range(self.attempts):
+            error = None
+            try:
+                url, res = await _get_page(client, app_id, lang, country)
+                if not self.retryable(res):
+                    return url, res
+            except (httpx.HTTPError, TimeoutError) as e:
+                # TimeoutError: superato 'PLAY_FETCH_DEADLINE' (la scadenza del controllo arriva come cancellazione)
+                error = e
+            if attempt == self.attempts - 1:
+                self.exhausted += 1
+                if error is not None:
+                    raise error
+                # noinspection PyUnboundLocalVariable
+                return url, res
+            self.retries += 1
+            await asyncio.sleep(self.delay(attempt))
+
+    def stats(self) -> dict:
+        return {
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "exhausted": self.exhausted
+        }
+
+
+retry_policy = RetryPolicy(attempts=PLAY_RETRY_ATTEMPTS, base_delay=PLAY_RETRY_BASE_DELAY,
+                           max_delay=PLAY_RETRY_MAX_DELAY)
+
+
+async def fetch(app_id: str, lang: str = "en", country: str = "us") -> FetchResult:
+    """
+    Scarica la pagina dell'app (ritentando secondo 'retry_policy') e ne restituisce stato e dettagli in un
+    FetchResult. Gli errori di rete, il circuit breaker aperto, il superamento di 'PLAY_FETCH_DEADLINE' o di
+    'PLAY_CHECK_DEADLINE' e le risposte diverse da 200 non sollevano eccezioni: sono riportati in 'error'.
+    """
+    deadline = asyncio.timeout(None)
+    token = _check_deadline.set(deadline)
+    try:
+        async with deadline:
+            url, res = await retry_policy.get_page(get_client(), app_id, lang, country)
+    except CircuitOpenError as e:
+        return FetchResult(app_id, detail_url(app_id, lang, country), None,
+                           "Circuit Open", error=ExtraHTTPError(str(e)))
+    except TimeoutError:
+        play_store_logger.warning("Deadline of %ss exceeded while fetching '%s'",
+                                  PLAY_CHECK_DEADLINE if deadline.expired() else PLAY_FETCH_DEADLINE, app_id)
+        return FetchResult(app_id, detail_url(app_id, lang, country), None,
+                           "Deadline Exceeded", error=ExtraHTTPError("Deadline exceeded"))
+    except httpx.HTTPError as e:
+        play_store_logger.warning("Network error while fetching '%s': %r", app_id, e)
+        return FetchResult(app_id, detail_url(app_id, lang, country), None,
+                           type(e).__name__, error=ExtraHTTPError(f"Network error: {e!r}"))
+    finally:
+        _check_deadline.reset(token)
+
+    if res.status_code == 304:
+        if (details := change_detector.unchanged_details(app_id, res, None)) is not None:
+            return FetchResult(app_id, url, res.status_code, res.reason_phrase, details=details, unchanged=True)
+    if res.status_code == 404:
+        return FetchResult(app_id, url, res.status_code, res.reason_phrase,
+                           error=NotFoundError("App not found(404)."))
+    if res.status_code != 200:
+        return FetchResult(app_id, url, res.status_code, res.reason_phrase,
+                           error=ExtraHTTPError(f"App not found. Status code {res.status_code} returned."))
+
+    section = details_section(dom := res.text)
+    digest = ChangeDetector.digest(dom, section)
+    if (details := change_detector.unchanged_details(app_id, res, digest)) is not None:
+        return FetchResult(app_id, url, res.status_code, res.reason_phrase, details=details, unchanged=True)
+
+    details = await parse_details(dom, section, app_id, url)
+    change_detector.remember(app_id, res, digest, details)
+    return FetchResult(app_id, url, res.status_code, res.reason_phrase, details=details)
+
+
+async def app(app_id: str, lang: str = "en", country: str = "us") -> dict:
+    """
+    Versione asincrona di 'google_play_scraper.app': scarica la pagina senza bloccare l'event loop e ne estrae
+    i campi usati dal bot. Solleva le stesse eccezioni (NotFoundError, ExtraHTTPError).
+    """
+    if not (result := await fetch(app_id, lang, country)).ok():
+        raise result.error
+    return result.details
+
+
+class DetailsCache:
+    """
+    Cache dei dettagli condivisa tra tutte le chat, indicizzata per app_id. Le voci restano valide per 'ttl'
+    secondi e, superati 'maxsize' elementi, vengono rimosse quelle usate meno di recente. Più controlli
+    contemporanei sulla stessa app attendono la stessa richiesta invece di farne una ciascuno.
+    """
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._in_flight: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, app_id: str) -> FetchResult:
+        if (result := self._cache.get(app_id)) is not None:
+            self.hits += 1
+            return result
+
+        if (task := self._in_flight.get(app_id)) is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        self.misses += 1
+        task = asyncio.create_task(fetch(app_id))
+        self._in_flight[app_id] = task
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._in_flight.pop(app_id, None)
+            else:
+                task.add_done_callback(lambda _: self._in_flight.pop(app_id, None))
+
+        if result.ok():
+            self._cache[app_id] = result
+        return result
+
+    def invalidate(self, app_id: str):
+        self._cache.pop(app_id, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            "size": len(self._cache),
+            "in_flight": len(self._in_flight)
+        }
+
+
+details_cache = DetailsCache(ttl=float(os.getenv("PLAY_CACHE_TTL", 30)),
+                             maxsize=int(os.getenv("PLAY_CACHE_MAXSIZE", 1024)))
+
+
+async def cached_fetch(app_id: str) -> FetchResult:
+    return await details_cache.get(app_id)
@@ -0,0 +1,129 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import zipfile
+from collections import Counter
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROFILE_DEFAULT_SECONDS = float(os.getenv("PROFILE_DEFAULT_SECONDS", 30))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", 300))
+# intervallo di campionamento degli stack per il file "collapsed" (flamegraph.pl, speedscope, ...)
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.005))
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", 40))
+PROFILE_OUTPUT = os.getenv("PROFILE_OUTPUT", "logs/profile.zip")
+
+
+class ProfileBusyError(Exception):
+    pass
+
+
+class StackSampler(threading.Thread):
+    """
+    Thread che ogni 'interval' secondi legge lo stack del thread dell'event loop e conta gli stack uguali.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="profile_stack_sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            if (frame := sys._current_frames().get(self.thread_id)) is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+_lock = asyncio.Lock()
+
+
+async def profile_cpu(seconds: float) -> tuple[str, str]:
+    """
+    Profila per 'seconds' secondi tutto ciò che gira sull'event loop: cProfile per le funzioni più costose
+    (cumulativo) e il campionatore per gli stack. Restituisce il percorso dello zip e un breve riepilogo.
+    """
+    if _lock.locked():
+        raise ProfileBusyError("Another profile is running")
+    async with _lock:
+        profile = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL)
+        sampler.start()
+        profile.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile.disable()
+            sampler.stop()
+
+        out = io.StringIO()
+        stats = pstats.Stats(profile, stream=out)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_TOP)
+        out.write("\n")
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(PROFILE_TOP)
+        # profilo completo, apribile con pstats / snakeviz
+        profile.dump_stats(path := PROFILE_OUTPUT + ".pstats")
+        with zipfile.ZipFile(PROFILE_OUTPUT, "w", zipfile.ZIP_DEFLATED) as z:
+            z.writestr("top_functions.txt", out.getvalue())
+            z.writestr("stacks.collapsed", sampler.collapsed())
+            z.write(path, "profile.pstats")
+        os.remove(path)
+        return PROFILE_OUTPUT, (f"{sampler.samples} campioni, {len(sampler.stacks)} stack distinti, "
+                                f"{stats.total_calls} chiamate in {stats.total_tt:.2f}s")
+
+
+async def profile_memory(seconds: float) -> tuple[str, str]:
+    """
+    Differenza tra due snapshot di tracemalloc presi a 'seconds' secondi di distanza, per riga e per file.
+    """
+    if _lock.locked():
+        raise ProfileBusyError("Another profile is running")
+    async with _lock:
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            start = time.monotonic()
+            await asyncio.sleep(seconds)
+            after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started:
+                tracemalloc.stop()
+
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        before, after = before.filter_traces(filters), after.filter_traces(filters)
+        text = (f"Intervallo: {time.monotonic() - start:.1f}s - memoria tracciata: {current / 1024:.0f} KiB "
+                f"(picco {peak / 1024:.0f} KiB)\n\n")
+        for key_type in ("lineno", "filename"):
+            text += f"--- Top {PROFILE_TOP} differenze per {key_type} ---\n"
+            text += "".join(f"{diff}\n" for diff in after.compare_to(before, key_type)[:PROFILE_TOP]) + "\n"
+
+        with zipfile.ZipFile(PROFILE_OUTPUT, "w", zipfile.ZIP_DEFLATED) as z:
+            z.writestr("memory_diff.txt", text)
+        return PROFILE_OUTPUT, f"memoria tracciata {current / 1024:.0f} KiB (picco {peak / 1024:.0f} KiB)"
@@ -4,11 +4,17 @@ from logging import handlers
 from time import sleep
 
 import pytz
-import requests
+from google_play_scraper.exceptions import ExtraHTTPError
 from telegram import MessageEntity
 
+import clock
+import play_store
+from check_scheduler import check_scheduler
 from decorators import send_action
-from job_queue import reschedule
+from job_queue import reschedule, new_adaptive_state, effective_interval, ADAPTIVE_MAX_FACTOR
+from app_record import AppRecord, IntervalInput, upgrade_apps
+from app_index import app_indexes, normalize_name
+from metrics import backup_sizes
 from utils import *
 
 settings_logger = logging.getLogger("settings_logger")
@@ -158,10 +164,8 @@ async def set_defaults(update: Update, context: CallbackContext):
                 context.chat_data["messages_to_delete"] = message.id
                 return 2
 
-            context.chat_data["settings"]["default_check_interval"]["timedelta"] = timedelta(days=days + months * 30,
-                                                                                             seconds=seconds,
-                                                                                             minutes=minutes,
-                                                                                             hours=hours)
+            context.chat_data["settings"]["default_check_interval"]["timedelta"] = \
+                IntervalInput(months, days, hours, minutes, seconds).timedelta()
             context.chat_data["settings"]["default_check_interval"]["input"] = {
                 "days": days,
                 "months": months,
@@ -445,7 +449,7 @@ async def menage_apps(update: Update, context: CallbackContext):
                 ]
             ]
 
-            if await is_there_suspended_app(context.chat_data["apps"]):
+            if await is_there_suspended_app(context.chat_data):
                 keyboard[1].append(InlineKeyboardButton(text="⏯ Riattiva App", callback_data="unsuspend_app"))
 
             await parse_conversation_message(context=context,
@@ -490,10 +494,10 @@ async def menage_apps(update: Update, context: CallbackContext):
                 ]
 
                 text = "👁‍🗨 <b>Watched Apps</b>\n\n"
-                for a in context.chat_data["apps"]:
-                    text += (f"  {a}. {context.chat_data['apps'][a]['app_name']}\n"
-                             f"    <code>Interval</code> {context.chat_data['apps'][a]['check_interval']}\n"
-                             f"    <code>Send On Check</code> {context.chat_data['apps'][a]['send_on_check']}\n"
+                for n, a in enumerate(context.chat_data["apps"], start=1):
+                    text += (f"  {n}. {context.chat_data['apps'][a].app_name}\n"
+                             f"    <code>Interval</code> {context.chat_data['apps'][a].interval_text}\n"
+                             f"    <code>Send On Check</code> {context.chat_data['apps'][a].send_on_check}\n"
                              )
 
                 text += "\n🆘 Per i dettagli su un'applicazione, scegli 🖋 Modifica\n\n🔸Scegli un'opzione."
@@ -539,9 +543,9 @@ async def backup_and_restore(update: Update, context: CallbackContext):
             text += "🔸 Scegli un'opzione."
         else:
             text += f"ℹ️ Hai {len(cd['backups'])} file(s) di backup.\n\n🔍 <b>Informazioni</b>\n\n"
-            for backup in cd["backups"]:
+            for n, backup in enumerate(cd["backups"], start=1):
                 b = cd["backups"][backup]
-                text += f"      {backup}. <code>{b['file_name']}</code>\n"
+                text += f"      {n}. <code>{b['file_name']}</code>\n"
             if removed:
                 text += "\n⚠️ Alcuni file di backup non sono più presenti. @Linxay potrebbe averli rimossi\n"
             text += ("\n🔸 Per <b>visualizzare</b>, <b>ripristinare</b> o <b>cancellare</b> un backup, "
@@ -626,8 +630,8 @@ async def backup_and_restore(update: Update, context: CallbackContext):
             return ConversationHandler.END
 
         inp = int(''.join(filter(set('0123456789').__contains__, update.message.text)))
-        if inp > (max_index := len(cd["backups"])):
-            text = f"❌ Fornisci un indice valido, compreso tra 1 e {max_index}"
+        if (key := key_at_position(cd["backups"], inp)) is None:
+            text = f"❌ Fornisci un indice valido, compreso tra 1 e {len(cd['backups'])}"
             message = await context.bot.send_message(chat_id=update.effective_chat.id, text=text)
             await schedule_messages_to_delete(context=context, messages={
                 message.id: {
@@ -649,7 +653,7 @@ async def backup_and_restore(update: Update, context: CallbackContext):
 
         await delete_message(context=context, chat_id=update.effective_chat.id, message_id=update.effective_message.id)
 
-        fl = cd["backups"][inp]
+        fl = cd["backups"][key]
         path = "backups/" + str(update.effective_chat.id) + "/" + fl["file_name"]
         if not os.path.isfile(path):
             text += ("❌ Il file non è stato trovato. È possibile che @Linxay lo abbia eliminato. "
@@ -667,7 +671,7 @@ async def backup_and_restore(update: Update, context: CallbackContext):
                 "keyboard": keyboard,
                 "message_id": update.effective_message.id
             }, context=context)
-            del cd["backups"][inp]
+            del cd["backups"][key]
             return ConversationState.BACKUP_MENU
 
         text += (f"📁 File Name: <code>{fl['file_name']}</code>\n\n"
@@ -714,12 +718,13 @@ async def backup_and_restore(update: Update, context: CallbackContext):
             return
         cd["temp"] = {}
         filename = datetime.now(pytz.timezone("Europe/Rome")).strftime("%d_%m_%Y_%H_%M_%S") + ".yml"
-        cd["backups"][len(cd["backups"]) + 1] = {}
-        cd["backups"][len(cd["backups"])]["file_name"] = filename
-        cd["backups"][len(cd["backups"])]["backup_time"] = datetime.now(pytz.timezone("Europe/Rome"))
+        cd["backups"][filename] = {
+            "file_name": filename,
+            "backup_time": datetime.now(pytz.timezone("Europe/Rome"))
+        }
 
         if not await yaml_dict_dumper(cd, path := (user_folder + "/" + filename)):
-            del cd["backups"][len(cd["backups"])]
+            del cd["backups"][filename]
 
             text += ("❌ <u>Il file di backup non è stato creato a cause di un errore</u>\n\n"
                      "Contatta @AleLntr per assitenza."
@@ -828,14 +833,9 @@ async def backup_and_restore(update: Update, context: CallbackContext):
         ]
         try:
             os.remove(path)
-            for k, v in cd["backups"].items():
-                if v["file_name"] == filename:
-                    for k1, v1 in cd["backups"].items():
-                        if k1 >= k:
-                            cd["backups"][k] = cd["backups"][k1]
-                            k += 1
-                    del cd["backups"][len(cd["backups"])]
-                    break
+            # i backup sono indicizzati per nome del file
+            cd["backups"].pop(filename, None)
+            backup_sizes.refresh()
         except FileNotFoundError:
             text += ("❌ Il file non è stato trovato. È possibile che @Linxay lo abbia già rimosso.\n\n"
                      "🔸 Scegli un'opzione")
@@ -895,7 +895,12 @@ async def backup_and_restore(update: Update, context: CallbackContext):
                 ]
             ]
         else:
-            (cd := context.chat_data).update(new_cd)
+            first_free_index = next_app_index(cd := context.chat_data)
+            cd.update(new_cd)
+            upgrade_apps(cd)
+            # gli indici usati dopo il backup non vanno riassegnati: i pulsanti già inviati ('suspend_app {index}',
+            # 'edit_from_job {index}', ...) agirebbero sulle app aggiunte in seguito
+            cd["next_app_index"] = max(first_free_index, next_app_index(cd))
             await reschedule(context, cd, True)
             text += ("✅ <i>Backup correttamente ripristinato</i>\n\n"
                      "🔸 Scegli un'opzione")
@@ -1344,6 +1349,7 @@ async def manage_users_and_permissions(update: Update, context: CallbackContext)
     if update.callback_query and update.callback_query.data.startswith("delete_backup_files"):
         try:
             shutil.rmtree(f"backups/{update.callback_query.data.split(' ')[-1]}")
+            backup_sizes.refresh()
             text += "✅ Backups rimossi con successo"
             keyboard = [
                 [
@@ -1533,29 +1539,29 @@ async def list_apps(update: Update, context: CallbackContext):
                  "🔸 Scegli un'opzione.")
 
     else:
-        for a in context.chat_data["apps"]:
+        for n, a in enumerate(context.chat_data["apps"], start=1):
             ap = context.chat_data["apps"][a]
-            text += (f"  {a}. <i>{ap['app_name']}</i>\n"
-                     f"     🔸<u>App ID</u>: <code>{ap['app_id']}</code>\n"
-                     f"     🔸<u>App Link</u>: <a href=\"{ap['app_link']}\">link 🔗</a>\n"
-                     f"     🔸<u>Current Version</u>: <code>{ap['current_version']}</code>\n"
-                     f"     🔸<u>Last Update</u>: <code>{ap['last_update']}</code>\n\n"
+            text += (f"  {n}. <i>{ap.app_name}</i>\n"
+                     f"     🔸<u>App ID</u>: <code>{ap.app_id}</code>\n"
+                     f"     🔸<u>App Link</u>: <a href=\"{ap.app_link}\">link 🔗</a>\n"
+                     f"     🔸<u>Current Version</u>: <code>{ap.current_version}</code>\n"
+                     f"     🔸<u>Last Update</u>: <code>{ap.last_update_text}</code>\n\n"
                      f"     🔸<u>Check Interval</u>: <code>"
-                     f"{ap['check_interval']['input']['months']}m"
-                     f"{ap['check_interval']['input']['days']}d"
-                     f"{ap['check_interval']['input']['hours']}h"
-                     f"{ap['check_interval']['input']['minutes']}min"
-                     f"{ap['check_interval']['input']['seconds']}s</code>\n"
-                     f"     🔸<u>Send On Check</u>: <code>{ap['send_on_check']}</code>\n\n")
+                     f"{ap.interval_input.months}m"
+                     f"{ap.interval_input.days}d"
+                     f"{ap.interval_input.hours}h"
+                     f"{ap.interval_input.minutes}min"
+                     f"{ap.interval_input.seconds}s</code>\n"
+                     f"     🔸<u>Send On Check</u>: <code>{ap.send_on_check}</code>\n\n")
 
             text += (f"     🔸<u>Last Check</u>: <code>None</code>\n"
-                     if ap["last_check"] is None
+                     if ap.last_check is None
                      else f"     🔸<u>Last Check</u>: <code>"
-                          f"{datetime.strftime(ap['last_check'], '%d %B %Y – %H:%M:%S')}"
+                          f"{datetime.strftime(ap.last_check, '%d %B %Y – %H:%M:%S')}"
                           f"</code>\n")
 
-            text += (f"     🔸<u>Next Check</u>: <code>{datetime.strftime(ap['next_check'], '%d %B %Y – %H:%M:%S')}"
-                     f"</code>\n\n     ⏸ <b>Suspended</b>: <code>{ap['suspended']}</code>\n\n")
+            text += (f"     🔸<u>Next Check</u>: <code>{datetime.strftime(ap.next_check, '%d %B %Y – %H:%M:%S')}"
+                     f"</code>\n\n     ⏸ <b>Suspended</b>: <code>{ap.suspended}</code>\n\n")
 
         text += f"🔹 Scegli un'opzione."
 
@@ -1623,8 +1629,8 @@ async def add_app(update: Update, context: CallbackContext):
 
         if len(context.chat_data["apps"]) != 0:
             text += "🗃 <u>Elenco</u>\n\n"
-            for ap in context.chat_data["apps"]:
-                text += f"  {ap}. {context.chat_data['apps'][ap]['app_name']}\n"
+            for n, ap in enumerate(context.chat_data["apps"], start=1):
+                text += f"  {n}. {context.chat_data['apps'][ap].app_name}\n"
 
         text += "\n🔸 Manda il link all'applicazione su Google Play."
 
@@ -1651,12 +1657,11 @@ async def add_app(update: Update, context: CallbackContext):
                 del context.chat_data["temp"]["message_to_delete"]
 
             link = update.message.text[entities[0].offset:]
-            res = requests.get(link)
+            app_details = await get_app_details_with_link(link=link)
 
-            if res.status_code != 200:
-                settings_logger.warning(f"Not able to gather link {link}: {res.reason}")
+            if isinstance(app_details, ExtraHTTPError):
                 text = (f"❌ A causa di un problema di rete, non riuscito a reperire il link che hai mandato.\n\n"
-                        f"🔍 <i>Reason</i>\n<code>❓ {res.reason}</code>\n\n"
+                        f"🔍 <i>Reason</i>\n<code>❓ {app_details}</code>\n\n"
                         f"🆘 Se il problema persiste, contatta @AleLntr\n\n"
                         f"🔸 Puoi riprovare a mandare lo stesso link o cambiarlo.")
 
@@ -1670,26 +1675,6 @@ async def add_app(update: Update, context: CallbackContext):
 
                 return ConversationState.SEND_LINK
 
-            app_details = await get_app_details_with_link(link=link)
-
-            for ap in (a := context.chat_data["apps"]):
-                if a[ap]["app_id"] == app_details.get('appId'):
-                    keyboard = [
-                        [
-                            InlineKeyboardButton(text="✏ Modifica l'App", callback_data=f"edit_app_from_add {ap}"),
-                            InlineKeyboardButton(text="🔙 Torna Indietro", callback_data="back_to_settings")
-                        ]
-                    ]
-                    await parse_conversation_message(context=context,
-                                                     data={
-                                                         "chat_id": update.effective_chat.id,
-                                                         "message_id": -1,
-                                                         "text": "⚠ Hai già aggiunto questa applicazione.\n\n"
-                                                                 "🔸 Scegli un'opzione.",
-                                                         "reply_markup": InlineKeyboardMarkup(keyboard)
-                                                     })
-                    return ConversationHandler.END
-
             if isinstance(app_details, NotFoundError) or isinstance(app_details, IndexError):
                 if isinstance(app_details, NotFoundError):
                     text = ("⚠️ Ho avuto problemi a reperire l'applicazione.\n\n"
@@ -1725,6 +1710,23 @@ async def add_app(update: Update, context: CallbackContext):
                                          message_id=context.chat_data["send_link_message"])
                     del context.chat_data["send_link_message"]
 
+                if (ap := app_indexes.get(context.chat_data).find_app_id(app_details.get('appId'))) is not None:
+                    keyboard = [
+                        [
+                            InlineKeyboardButton(text="✏ Modifica l'App", callback_data=f"edit_app_from_add {ap}"),
+                            InlineKeyboardButton(text="🔙 Torna Indietro", callback_data="back_to_settings")
+                        ]
+                    ]
+                    await parse_conversation_message(context=context,
+                                                     data={
+                                                         "chat_id": update.effective_chat.id,
+                                                         "message_id": -1,
+                                                         "text": "⚠ Hai già aggiunto questa applicazione.\n\n"
+                                                                 "🔸 Scegli un'opzione.",
+                                                         "reply_markup": InlineKeyboardMarkup(keyboard)
+                                                     })
+                    return ConversationHandler.END
+
                 name = app_details.get('title')
                 current_version = app_details.get('version')
                 last_update = datetime.strptime(app_details.get('lastUpdatedOn'), '%b %d, %Y')
@@ -1737,7 +1739,7 @@ async def add_app(update: Update, context: CallbackContext):
                     "app_name": name,
                     "url": link,
                     "current_version": current_version,
-                    "last_update": last_update.strftime("%d %B %Y"),
+                    "last_update": last_update,
                     "appId": app_id
                 }
 
@@ -1854,28 +1856,42 @@ async def set_app(update: Update, context: CallbackContext):
             del cd["edit_message"]
         ap = cd["apps"][int(cd["app_index_to_edit"])]
         cd["setting_app"] = {
-            "app_name": ap["app_name"],
-            "app_link": ap["app_link"],
-            "current_version": ap["current_version"],
-            "last_update": ap["last_update"],
-            "app_id": ap["app_id"]
+            "app_name": ap.app_name,
+            "app_link": ap.app_link,
+            "current_version": ap.current_version,
+            "last_update": ap.last_update,
+            "app_id": ap.app_id
         }
 
         cd["editing"] = True
 
     if update.callback_query and (update.callback_query.data.startswith("edit_app_from_check") or
                                   update.callback_query.data.startswith("edit_app_from_add")):
-        index = update.callback_query.data.split(" ")[1]
-        cd["app_index_to_edit"] = int(index)
+        index = int(update.callback_query.data.split(" ")[1])
+        # il pulsante può riferirsi a un'app rimossa nel frattempo
+        if (ap := cd["apps"].get(index)) is None:
+            keyboard = [
+                [InlineKeyboardButton(text="🗑 Chiudi", callback_data=f"delete_message {update.effective_message.id}")]
+            ] if update.callback_query.data.startswith("edit_app_from_check") else [
+                [InlineKeyboardButton(text="🔙 Torna Indietro", callback_data="back_to_settings")]
+            ]
+            await parse_conversation_message(context=context, data={
+                "chat_id": update.effective_chat.id,
+                "text": "✏ <b>Modifica App</b>\n\n🔹 L'app non è più presente nell'elenco.",
+                "message_id": update.effective_message.id,
+                "reply_markup": InlineKeyboardMarkup(keyboard)
+            })
+            return ConversationHandler.END
+
+        cd["app_index_to_edit"] = index
         if update.callback_query.data.startswith("edit_app_from_check"):
             cd["from_check"] = True
-        ap = cd["apps"][int(index)]
         cd["setting_app"] = {
-            "title": ap["app_name"],
-            "url": ap["app_link"],
-            "current_version": ap["current_version"],
-            "last_update": ap["last_update"],
-            "appId": ap["app_id"]
+            "title": ap.app_name,
+            "url": ap.app_link,
+            "current_version": ap.current_version,
+            "last_update": ap.last_update,
+            "appId": ap.app_id
         }
 
         cd["editing"] = True
@@ -1930,17 +1946,15 @@ async def set_app(update: Update, context: CallbackContext):
     sleep(1)
 
     if update.callback_query and update.callback_query.data == "set_default_values":
-        cd["apps"][len(cd["apps"]) + 1] = {
-            "app_name": cd["setting_app"]["app_name"],
-            "app_link": cd["setting_app"]["url"],
-            "current_version": cd["setting_app"]["current_version"],
-            "last_update": cd["setting_app"]["last_update"],
-            "app_id": cd["setting_app"]["appId"],
-            "last_check": None,
-            "suspended": False,
-            "check_interval": cd["settings"]["default_check_interval"],
-            "send_on_check": cd["settings"]["default_send_on_check"]
-        }
+        add_app_record(cd, AppRecord(
+            app_name=cd["setting_app"]["app_name"],
+            app_link=cd["setting_app"]["url"],
+            current_version=cd["setting_app"]["current_version"],
+            last_update=cd["setting_app"]["last_update"],
+            app_id=cd["setting_app"]["appId"],
+            interval_input=IntervalInput.from_setting(cd["settings"]["default_check_interval"]),
+            send_on_check=cd["settings"]["default_send_on_check"]
+        ))
 
         del cd["setting_app"]
 
@@ -1949,8 +1963,8 @@ async def set_app(update: Update, context: CallbackContext):
     else:
         if update.callback_query and update.callback_query.data == "edit_set_default_values":
             index = int(cd["app_index_to_edit"])
-            cd["apps"][index]["check_interval"] = cd["settings"]["default_check_interval"]
-            cd["apps"][index]["send_on_check"] = cd["settings"]["default_send_on_check"]
+            cd["apps"][index].set_interval(IntervalInput.from_setting(cd["settings"]["default_check_interval"]))
+            cd["apps"][index].send_on_check = cd["settings"]["default_send_on_check"]
             return await schedule_app_check(cd, True, update, context)
 
     if not update.callback_query:
@@ -1999,7 +2013,7 @@ async def set_app(update: Update, context: CallbackContext):
                     "minutes": minutes,
                     "hours": hours
                 },
-                "timedelta": timedelta(days=days + months * 30, seconds=seconds, minutes=minutes, hours=hours)
+                "timedelta": IntervalInput(months, days, hours, minutes, seconds).timedelta()
             }
 
             # noinspection DuplicatedCode
@@ -2063,35 +2077,30 @@ async def set_app(update: Update, context: CallbackContext):
 
     if update.callback_query and update.callback_query.data.startswith("send_on_check"):
         if adding:
-            cd["apps"][len(cd["apps"]) + 1] = {
-                "app_name": cd["setting_app"]["app_name"],
-                "app_link": cd["setting_app"]["url"],
-                "current_version": cd["setting_app"]["current_version"],
-                "last_update": cd["setting_app"]["last_update"],
-                "app_id": cd["setting_app"]["appId"],
-                "last_check": None,
-                "suspended": False
-            }
-
-            ap = cd["apps"][len(cd["apps"])]
+            ap = cd["apps"][add_app_record(cd, AppRecord(
+                app_name=cd["setting_app"]["app_name"],
+                app_link=cd["setting_app"]["url"],
+                current_version=cd["setting_app"]["current_version"],
+                last_update=cd["setting_app"]["last_update"],
+                app_id=cd["setting_app"]["appId"]
+            ))]
         else:
             ap = cd["apps"][int(cd["app_index_to_edit"])]
 
-        ap["check_interval"] = cd["setting_app"]["check_interval"]
+        ap.set_interval(IntervalInput.from_setting(cd["setting_app"]["check_interval"]))
 
-        ap["next_check"] = (datetime.now(pytz.timezone('Europe/Rome')) +
-                            cd["setting_app"]["check_interval"]["timedelta"])
+        ap.next_check = clock.now() + ap.interval
 
-        ap["send_on_check"] = True if update.callback_query.data == "send_on_check_true" else False
+        ap.send_on_check = True if update.callback_query.data == "send_on_check_true" else False
 
-        bot_logger.info(f"App {ap['app_name']} ({ap['app_id']}) Settled Successfully -> "
+        bot_logger.info(f"App {ap.app_name} ({ap.app_id}) Settled Successfully -> "
                         f"Interval: "
-                        f"{ap['check_interval']['input']['months']}months "
-                        f"{ap['check_interval']['input']['days']}days "
-                        f"{ap['check_interval']['input']['hours']}hours "
-                        f"{ap['check_interval']['input']['minutes']}minutes "
-                        f"{ap['check_interval']['input']['seconds']}seconds – Send On Check: "
-                        f"{ap['send_on_check']}")
+                        f"{ap.interval_input.months}months "
+                        f"{ap.interval_input.days}days "
+                        f"{ap.interval_input.hours}hours "
+                        f"{ap.interval_input.minutes}minutes "
+                        f"{ap.interval_input.seconds}seconds – Send On Check: "
+                        f"{ap.send_on_check}")
 
         if "setting_app" in cd:
             del cd["setting_app"]
@@ -2134,16 +2143,16 @@ async def edit_app(update: Update, context: CallbackContext):
             text = ("✏ <b>Edit App</b>\n\n"
                     "🗃 <b>Elenco Applicazioni</b>\n\n")
 
-            for ap in cd["apps"]:
+            for n, ap in enumerate(cd["apps"], start=1):
                 a = cd["apps"][ap]
-                text += (f"  {ap}. <i>{a['app_name']}</i>\n"
+                text += (f"  {n}. <i>{a.app_name}</i>\n"
                          f"      <u>Check Interval</u> "
-                         f"<code>{a['check_interval']['input']['months']}m</code>"
-                         f"<code>{a['check_interval']['input']['days']}d</code>"
-                         f"<code>{a['check_interval']['input']['hours']}h</code>"
-                         f"<code>{a['check_interval']['input']['minutes']}min</code>"
-                         f"<code>{a['check_interval']['input']['seconds']}s</code>\n"
-                         f"      <u>Send On Check</u> <code>{a['send_on_check']}</code>\n\n")
+                         f"<code>{a.interval_input.months}m</code>"
+                         f"<code>{a.interval_input.days}d</code>"
+                         f"<code>{a.interval_input.hours}h</code>"
+                         f"<code>{a.interval_input.minutes}min</code>"
+                         f"<code>{a.interval_input.seconds}s</code>\n"
+                         f"      <u>Send On Check</u> <code>{a.send_on_check}</code>\n\n")
 
             text += "🔸 Scegli un'applicazione digitando il <u>numero corrispondente</u> o il <u>nome</u>."
 
@@ -2170,11 +2179,10 @@ async def edit_app(update: Update, context: CallbackContext):
 
             del cd["temp"]["message_to_delete"]
 
-        app_names = create_edit_app_list(cd)
         message = update.effective_message
 
         if not message.text.strip().isnumeric():
-            if (inpt := await input_name_fixer(message.text)) not in app_names:
+            if (index := await get_app_from_string(await input_name_fixer(message.text), context)) is None:
                 await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.TYPING)
                 sleep(1)
                 message_id = await parse_conversation_message(context=context,
@@ -2200,10 +2208,10 @@ async def edit_app(update: Update, context: CallbackContext):
 
                 return ConversationState.EDIT_SELECT_APP
 
-            cd["app_index_to_edit"] = await get_app_from_string(inpt, context=context)
+            cd["app_index_to_edit"] = index
 
         if (inpt := message.text.strip()).isnumeric():
-            if int(message.text.strip()) > len(app_names) or int(message.text.strip()) < 0:
+            if (index := key_at_position(cd["apps"], int(inpt))) is None:
                 text = "🔴 <b>Invalid Index</b>\n\n🔸 Fornisci un indice valido."
 
                 message_id = await parse_conversation_message(context=context,
@@ -2228,7 +2236,7 @@ async def edit_app(update: Update, context: CallbackContext):
 
                 return ConversationState.EDIT_SELECT_APP
 
-            cd["app_index_to_edit"] = inpt
+            cd["app_index_to_edit"] = index
 
         await schedule_messages_to_delete(context=context,
                                           messages={
@@ -2240,7 +2248,7 @@ async def edit_app(update: Update, context: CallbackContext):
 
         text = (f"🔵 <b>App Found</b>\n\n"
                 f"▶️ <code>"
-                f"{cd['apps'][int(cd['app_index_to_edit'])]['app_name']}"
+                f"{cd['apps'][int(cd['app_index_to_edit'])].app_name}"
                 f"</code>\n\n"
                 f"🔸 È l'applicazione che vuoi modificare?")
 
@@ -2297,9 +2305,9 @@ async def remove_app(update: Update, context: CallbackContext):
             text = ("➖ <b>Remove App</b>\n\n"
                     "🗃 <b>Elenco Applicazioni</b>\n\n")
 
-            for ap in cd["apps"]:
+            for n, ap in enumerate(cd["apps"], start=1):
                 a = cd["apps"][ap]
-                text += f"  {ap}. <i>{a['app_name']}</i>\n"
+                text += f"  {n}. <i>{a.app_name}</i>\n"
 
             text += "\n🔸 Scegli un'applicazione da rimuovere indicando l'<u>indice</u> o il <u>nome</u>."
             message_id = await parse_conversation_message(context=context,
@@ -2322,14 +2330,15 @@ async def remove_app(update: Update, context: CallbackContext):
 
         if (not update.message.text.strip().isnumeric() and
             (index := await get_app_from_string(update.message.text.strip().lower(), context))) or (
-                (index := update.message.text.strip()).isnumeric() and 0 < int(index) <= len(cd["apps"])):
+                (position := update.message.text.strip()).isnumeric() and
+                (index := key_at_position(cd["apps"], int(position))) is not None):
             await delete_message(context=context, chat_id=update.effective_chat.id,
                                  message_id=update.effective_message.id)
             ap = cd["apps"][int(index)]
-            suspended = ap["suspended"]
+            suspended = ap.suspended
             cd["app_index_to_delete"] = int(index)
             text = (f"🔵 <b>App Found</b>\n\n"
-                    f"🔸 App Name: <code>{ap['app_name']}</code>\n\n"
+                    f"🔸 App Name: <code>{ap.app_name}</code>\n\n"
                     f"🔹 Vuoi rimuovere questa applicazione?")
 
             keyboard = [
@@ -2401,18 +2410,13 @@ async def remove_app(update: Update, context: CallbackContext):
                                  message_id=cd["temp"]["message_to_delete"])
             del cd["temp"]["message_to_delete"]
 
-        app_name = cd["apps"][cd["app_index_to_delete"]]['app_name']
-        app_id = cd["apps"][cd["app_index_to_delete"]]["app_id"]
-
-        for j in context.job_queue.get_jobs_by_name(app_name):
-            j.schedule_removal()
+        app_name = cd["apps"][cd["app_index_to_delete"]].app_name
+        app_id = cd["apps"][cd["app_index_to_delete"]].app_id
 
-        for ap in cd["apps"]:
-            if int(ap) < int(cd["app_index_to_delete"]):
-                continue
-            elif int(ap) < len(cd["apps"]):
-                cd["apps"][ap] = cd["apps"][int(ap) + 1]
-        del cd["apps"][len(cd["apps"])]
+        # gli indici delle altre app non cambiano (vedi 'add_app_record')
+        check_scheduler.cancel(update.effective_chat.id, cd["app_index_to_delete"])
+        app_indexes.get(cd).remove(cd["app_index_to_delete"], cd["apps"][cd["app_index_to_delete"]])
+        del cd["apps"][cd["app_index_to_delete"]]
         del cd["app_index_to_delete"]
 
         bot_logger.info(f"App {app_name} ({app_id}) deleted successfully")
@@ -2454,17 +2458,23 @@ async def suspend_app(update: Update, context: CallbackContext):
                                      message_id=cd["delete_app_message"])
                 del cd["delete_app_message"]
 
-            li = update.callback_query.data.split(" ")
+            index = int(update.callback_query.data.split(" ")[1])
 
-            if cd["apps"][int(li[1])]["suspended"]:
+            # il pulsante può riferirsi a un'app rimossa nel frattempo
+            if (ap := cd["apps"].get(index)) is None:
+                text = ("⏸ <b>Sospendi Controlli App</b>\n\n"
+                        "🔹 L'app non è più presente nell'elenco.")
+            elif ap.suspended:
                 text = (f"⏸ <b>Sospendi Controlli App</b>\n\n"
-                        f"🔹 L'app <code>{cd['apps'][int(li[1])]['app_name']}</code> era già sospesa.\n\n"
+                        f"🔹 L'app <code>{ap.app_name}</code> era già sospesa.\n\n"
                         f"🔸 Puoi riattivarla dalle impostazioni.")
             else:
-                cd["apps"][int(li[1])]["suspended"] = True
+                ap.suspended = True
+                app_indexes.get(cd).set_suspended(index, True)
+                check_scheduler.cancel(update.effective_chat.id, index)
 
                 text = (f"⏸ <b>Sospendi Controlli App</b>\n\n"
-                        f"🔹  App <code>{cd['apps'][int(li[1])]['app_name']}</code> "
+                        f"🔹  App <code>{ap.app_name}</code> "
                         f"sospesa: non riceverai più aggiornamenti.\n\n"
                         f"🔸 Puoi riattivarla dalle impostazioni.")
 
@@ -2491,10 +2501,10 @@ async def suspend_app(update: Update, context: CallbackContext):
 
             keyboard = []
 
-            for ap in (a := cd["apps"]):
-                if a[ap]["suspended"]:
-                    keyboard.append([InlineKeyboardButton(text=f"{a[ap]['app_name']}",
-                                                          callback_data=f"unsuspend_app {ap}")])
+            # gli indici crescono con l'inserimento: ordinati seguono l'ordine dell'elenco
+            for ap in sorted(app_indexes.get(cd).suspended):
+                keyboard.append([InlineKeyboardButton(text=f"{cd['apps'][ap].app_name}",
+                                                      callback_data=f"unsuspend_app {ap}")])
 
             keyboard.append([InlineKeyboardButton(text="🔙 Torna Indietro", callback_data="back_to_settings")])
 
@@ -2508,25 +2518,26 @@ async def suspend_app(update: Update, context: CallbackContext):
             return ConversationState.UNSUSPEND_APP
 
         if update.callback_query.data.startswith("unsuspend_app"):
-            index = update.callback_query.data.split(" ")[1]
-            (ap := cd["apps"][int(index)])["suspended"] = False
-            text = ("⏯ <b>Riattiva Controlli App</b>\n\n"
-                    f"ℹ Controlli app <code>{ap['app_name']}</code> riattivati\n\n"
-                    f"🔸 Scegli un'opzione.")
-
-            suspended = False
-
-            for ap in (a := cd["apps"]):
-                if a[ap]["suspended"]:
-                    suspended = True
-                    break
+            index = int(update.callback_query.data.split(" ")[1])
+            if (ap := cd["apps"].get(index)) is None:
+                text = ("⏯ <b>Riattiva Controlli App</b>\n\n"
+                        "ℹ L'app non è più presente nell'elenco.\n\n"
+                        "🔸 Scegli un'opzione.")
+            else:
+                ap.suspended = False
+                app_indexes.get(cd).set_suspended(index, False)
+                ap.next_check = clock.now() + ap.interval
+                check_scheduler.schedule(update.effective_chat.id, index, ap.next_check)
+                text = ("⏯ <b>Riattiva Controlli App</b>\n\n"
+                        f"ℹ Controlli app <code>{ap.app_name}</code> riattivati\n\n"
+                        f"🔸 Scegli un'opzione.")
 
             keyboard = [
                 [
                     InlineKeyboardButton(text="⏯ Riattiva Altra App", callback_data="unsuspend_app"),
                     InlineKeyboardButton(text="🔙 Torna Indietro", callback_data="back_to_settings")
                 ]
-            ] if suspended else [
+            ] if await is_there_suspended_app(cd) else [
                 [
                     InlineKeyboardButton(text="🔙 Torna Indietro", callback_data="back_to_settings")
                 ]
@@ -2552,14 +2563,15 @@ async def see_app_settings(update: Update, context: CallbackContext):
         ap = cd["apps"][index]
 
         text = (f"🔍 <b>App Settings</b>\n\n"
-                f"  🔹App Name: <code>{ap['app_name']}</code>\n"
+                f"  🔹App Name: <code>{ap.app_name}</code>\n"
                 f"  🔹Check Interval: "
-                f"<code>{ap['check_interval']['input']['months']}m</code>"
-                f"<code>{ap['check_interval']['input']['days']}d</code>"
-                f"<code>{ap['check_interval']['input']['hours']}h</code>"
-                f"<code>{ap['check_interval']['input']['minutes']}min</code>"
-                f"<code>{ap['check_interval']['input']['seconds']}s</code>\n"
-                f"  🔹Send On Check: <code>{ap['send_on_check']}</code>\n\n"
+                f"<code>{ap.interval_input.months}m</code>"
+                f"<code>{ap.interval_input.days}d</code>"
+                f"<code>{ap.interval_input.hours}h</code>"
+                f"<code>{ap.interval_input.minutes}min</code>"
+                f"<code>{ap.interval_input.seconds}s</code>\n"
+                f"  🔹Send On Check: <code>{ap.send_on_check}</code>\n"
+                f"  🔹Adaptive: <code>{(ap.adaptive or {}).get('enabled', False)}</code>\n\n"
                 f"🔸 Scegli un'opzione.")
 
         message = await context.bot.send_message(chat_id=update.effective_chat.id,
@@ -2569,6 +2581,9 @@ async def see_app_settings(update: Update, context: CallbackContext):
         keyboard = [
             [
                 InlineKeyboardButton(text="✏ Modifica", callback_data=f"edit_app_from_check {index}"),
+                InlineKeyboardButton(text="🧠 Adattivo On/Off", callback_data=f"toggle_adaptive {index}")
+            ],
+            [
                 InlineKeyboardButton(text="🗑 Chiudi", callback_data=f"delete_message {message.id}")
             ]
         ]
@@ -2578,20 +2593,52 @@ async def see_app_settings(update: Update, context: CallbackContext):
                                                     reply_markup=InlineKeyboardMarkup(keyboard))
 
 
+async def toggle_adaptive(update: Update, context: CallbackContext):
+    if not await is_allowed_user(user_id=update.effective_chat.id, users=context.bot_data["users"]):
+        await context.bot.send_message(chat_id=update.effective_chat.id, text="❌ You are not allowed to use this bot.")
+        return ConversationState.TO_BE_ENDED
+
+    cd = context.chat_data
+    if (index := int(update.callback_query.data.split(" ")[1])) not in cd["apps"]:
+        return
+
+    ap = cd["apps"][index]
+    # sia attivandola che disattivandola lo stato adattivo riparte da capo
+    ap.adaptive = new_adaptive_state(not (ap.adaptive or {}).get("enabled", False))
+    if not ap.suspended:
+        ap.next_check = clock.now() + effective_interval(ap)
+        check_scheduler.schedule(update.effective_chat.id, index, ap.next_check)
+
+    text = (f"🧠 <b>Intervallo Adattivo</b>\n\n"
+            f"🔹 App <code>{ap.app_name}</code>: modalità adattiva "
+            f"<b>{'attivata' if ap.adaptive['enabled'] else 'disattivata'}</b>.\n\n"
+            f"ℹ Se attiva, dopo un aggiornamento l'app viene controllata fino a <code>{ADAPTIVE_MAX_FACTOR}</code> "
+            f"volte più spesso; l'intervallo si allunga dopo più controlli senza aggiornamenti, ma non supera mai "
+            f"quello impostato.")
+
+    keyboard = [
+        [InlineKeyboardButton(text="🗑 Chiudi", callback_data=f"delete_message {update.effective_message.id}")]
+    ]
+
+    await parse_conversation_message(context=context, data={
+        "chat_id": update.effective_chat.id,
+        "text": text,
+        "message_id": update.effective_message.id,
+        "reply_markup": InlineKeyboardMarkup(keyboard)
+    })
+
+
 async def get_app_details_with_link(link: str):
-    res = requests.get(link)
-    if res.status_code != 200:
-        settings_logger.warning(f"Not able to gather link {link}: {res.reason}")
-        return None
     try:
         id_app = link.split("id=")[1].split('&')[0]
-        app_details = app(app_id=id_app)
     except IndexError as e:
         return e
-    except NotFoundError as e:
-        return e
-    else:
-        return app_details
+
+    if not (result := await play_store.cached_fetch(app_id=id_app)).ok():
+        settings_logger.warning(f"Not able to gather link {link}: {result.reason}")
+        return result.error
+
+    return result.details
 
 
 async def delete_extemporary_message(update: Update, context: CallbackContext):
@@ -2604,17 +2651,11 @@ async def delete_extemporary_message(update: Update, context: CallbackContext):
 
 
 async def get_app_from_string(string: str, context: CallbackContext):
-    whitelist = set('abcdefghijklmnopqrstuvwxyz ')
-    for a in context.chat_data["apps"]:
-        if (string == ''.join(filter(whitelist.__contains__, context.chat_data["apps"][a]['app_name'].lower())).
-                replace("  ", " ")):
-            return a
-    return None
+    return app_indexes.get(context.chat_data).find_name(string)
 
 
 async def input_name_fixer(string: str):
-    whitelist = set('abcdefghijklmnopqrstuvwxyz ')
-    return ''.join(filter(whitelist.__contains__, string.lower())).replace("  ", " ")
+    return normalize_name(string)
 
 
 async def send_menage_apps_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -2640,10 +2681,8 @@ async def send_menage_apps_menu(update: Update, context: ContextTypes.DEFAULT_TY
         ]
     ]
 
-    for ap in (a := cd["apps"]):
-        if a[ap]["suspended"]:
-            keyboard[1].append(InlineKeyboardButton(text="⏯ Riattiva App", callback_data="unsuspend_app"))
-            break
+    if await is_there_suspended_app(cd):
+        keyboard[1].append(InlineKeyboardButton(text="⏯ Riattiva App", callback_data="unsuspend_app"))
 
     await parse_conversation_message(context=context,
                                      data={
@@ -2677,6 +2716,10 @@ async def is_owner_or_admin(context: ContextTypes.DEFAULT_TYPE, user_id: str | i
     return int(user_id) == context.bot_data["users"]["owner"] or int(user_id) == context.bot_data["users"]["admin"]
 
 
+async def is_owner(context: ContextTypes.DEFAULT_TYPE, user_id: str | int) -> bool:
+    return int(user_id) == context.bot_data["users"]["owner"]
+
+
 async def check_for_backups(user_id: int | str) -> dict:
     file_dict = {}
     try:
@@ -2684,8 +2727,8 @@ async def check_for_backups(user_id: int | str) -> dict:
     except FileNotFoundError:
         file_list = []
 
-    for counter, el in enumerate(file_list, start=1):
-        file_dict[int(counter)] = {
+    for el in file_list:
+        file_dict[el] = {
             "file_name": el,
             "backup_time": datetime.strptime(el, "%d_%m_%Y_%H_%M_%S.yml")
         }
@@ -2709,6 +2752,7 @@ async def clean_backups(limit: int):
                 else:
                     removed += 1
 
+    backup_sizes.refresh()
     return removed
 
 
@@ -2724,15 +2768,3 @@ async def update_allowed_ids_file(new_dict: dict):
         raise Exception(f'Errore durante la serializzazione YAML: {e}')
     except Exception as e:
         raise Exception(f"Errore imprevisto durante la serializzazione YAML: {e}")
-
-
-
-def create_edit_app_list(chat_data: dict) -> list:
-    whitelist = set('abcdefghijklmnopqrstuvwxyz ')
-    app_names = []
-    if "apps" in chat_data:
-        for a in chat_data["apps"]:
-            app_names.append(''.join(filter(whitelist.__contains__, str(chat_data["apps"][a]['app_name']).lower())).
-                             replace("  ", " "))
-
-    return app_names or []
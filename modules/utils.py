@@ -1,22 +1,27 @@
+import asyncio
 import os.path
 import re
 import glob
+import itertools
 
 import yaml
 import logging
 import telegram
-from google_play_scraper.exceptions import NotFoundError
 
 from telegram.constants import ChatAction
 from telegram.ext import CallbackContext, ContextTypes, ConversationHandler
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from google_play_scraper import app
 from datetime import datetime, timedelta
-from pytz import timezone
 
 from yaml_de_serializer import serialize_dict_to_yaml, deserialize_dict_from_yaml
 from config_values import *
 import modules.job_queue as job_queue
+import clock
+import play_store
+from check_scheduler import check_scheduler
+from app_record import AppRecord, IntervalInput
+from app_index import app_indexes
+from metrics import metrics, backup_sizes
 
 bot_logger = logging.getLogger("bot_logger")
 settings_logger = logging.getLogger("settings_logger")
@@ -91,11 +96,31 @@ async def get_app_id_from_link(link: str) -> str:
     return link.split('id=')[1].split('&hl=')[0]
 
 
-async def is_there_suspended_app(apps: dict) -> bool:
-    for ap in apps:
-        if apps[ap]['suspended']:
-            return True
-    return False
+async def is_there_suspended_app(cd: dict) -> bool:
+    return bool(app_indexes.get(cd).suspended)
+
+
+def next_app_index(cd: dict) -> int:
+    # il contatore manca nei dati (e nei backup) delle versioni precedenti: riparte dopo l'indice più alto
+    return cd.get("next_app_index", max(cd.get("apps", {}), default=0) + 1)
+
+
+def add_app_record(cd: dict, ap: AppRecord) -> int:
+    # l'indice di un'app è stabile: non viene riutilizzato né cambia quando vengono rimosse altre app, così i dati
+    # dei job e le callback ('suspend_app {index}', 'edit_from_job {index}', ...) restano validi
+    cd["next_app_index"] = next_app_index(cd)
+    chat_index = app_indexes.get(cd)
+    cd["apps"][index := cd["next_app_index"]] = ap
+    cd["next_app_index"] += 1
+    chat_index.add(index, ap)
+    return index
+
+
+def key_at_position(d: dict, position: int):
+    # negli elenchi app e backup sono numerati per posizione (1, 2, ...): posizione → chiave, None se non valida
+    if not 0 < position <= len(d):
+        return None
+    return next(itertools.islice(d, position - 1, None))
 
 
 async def parse_conversation_message(context: CallbackContext, data: dict):
@@ -294,11 +319,10 @@ async def initialize_chat_data(update: Update, context: CallbackContext):
                 file_name = el.split("/")[-1]
             except IndexError:
                 file_name = el.split("\\")[-1]
-            cd["backups"][len(cd["backups"]) + 1] = {}
-            cd["backups"][len(cd["backups"])]["file_name"] = file_name
-            file_name = file_name.split(".yml")[0]
-            cd["backups"][len(cd["backups"])]["backup_time"] = datetime.strptime(file_name,
-                                                                                 "%d_%m_%Y_%H_%M_%S")
+            cd["backups"][file_name] = {
+                "file_name": file_name,
+                "backup_time": datetime.strptime(file_name.split(".yml")[0], "%d_%m_%Y_%H_%M_%S")
+            }
 
     if "editing" in cd:
         del cd["editing"]
@@ -373,10 +397,16 @@ async def initialize_chat_data(update: Update, context: CallbackContext):
                     text += f"➡ <b>Backup Massimi</b>: {first_boot['settings']['max_backups']}\n\n"
 
                     if len(first_boot['apps']):
+                        # scaricate una sola volta: se la configurazione viene caricata, i risultati vengono
+                        # riusati da 'load_first_boot_configuration'
+                        found, failed = cd['first_boot_apps'] = await fetch_first_boot_apps(first_boot['apps'])
                         text += "➡ <b>Apps</b>\n"
                         for el in first_boot['apps']:
-                            ad = app(app_id=await get_app_id_from_link(first_boot['apps'][el]['link']))
-                            text += f"    - <u>Name</u>: <code>{ad.get('title')}</code>\n"
+                            if el in failed:
+                                text += (f"    - ⚠️ <code>{first_boot['apps'][el]['link']}</code>: "
+                                         f"<i>{failed[el]}</i>, non verrà aggiunta\n\n")
+                                continue
+                            text += f"    - <u>Name</u>: <code>{found[el].get('title')}</code>\n"
                             text += f"    - <u>Interval</u>: <code>{first_boot['apps'][el]['interval']}</code>\n"
                             text += (f"    - <u>Send On Check</u>: <code>{first_boot['apps'][el]['send_on_check']}"
                                      f"</code>\n\n")
@@ -535,6 +565,7 @@ async def load_first_boot_configuration(update: Update, context: CallbackContext
         await delete_message(context=context, chat_id=update.effective_chat.id,
                              message_id=update.effective_message.id)
         del cd['first_boot_configuration']
+        cd.pop('first_boot_apps', None)
 
         keyboard = [
             [InlineKeyboardButton(text="💡 Informazioni Generali", callback_data="print_tutorial {}")],
@@ -571,7 +602,7 @@ async def load_first_boot_configuration(update: Update, context: CallbackContext
     dci["input"]["minutes"] = values[3]
     dci["input"]["seconds"] = values[4]
 
-    dci["timedelta"] = timedelta(days=values[0] * 30 + values[1], hours=values[2], minutes=values[3], seconds=values[4])
+    dci["timedelta"] = IntervalInput(*values).timedelta()
 
     cd["settings"]["default_send_on_check"] = \
         (dp := cd["first_boot_configuration"]["settings"])["default_send_on_check"]
@@ -583,39 +614,31 @@ async def load_first_boot_configuration(update: Update, context: CallbackContext
 
     cd["settings"]["default_permissions"]["can_manage_users"] = False
 
-    for app_index in (apps := cd["first_boot_configuration"]["apps"]):
-        try:
-            app_details = app(app_id=await get_app_id_from_link(apps[app_index]["link"]))
-        except NotFoundError as e:
-            raise ValueError(f"App with link '{apps[app_index]['link']}' not found: {e}")
-        else:
-            cd["apps"][len(cd["apps"]) + 1] = {
-                "app_name": app_details["title"],
-                "app_id": app_details["appId"],
-                "app_link": app_details["url"],
-                "current_version": app_details["version"],
-                "last_check": None,
-                "last_update": datetime.strptime(app_details["lastUpdatedOn"], "%b %d, %Y").strftime("%d %B %Y"),
-                # 'next_check_time' viene creato in 'schedule_app_check'
-                "send_on_check": cd["first_boot_configuration"]["apps"][app_index]["send_on_check"],
-                "suspended": False
-            }
-            values = await parse_interval(cd["first_boot_configuration"]["apps"][len(cd["apps"])]["interval"])
-            cd["apps"][len(cd["apps"])]["check_interval"] = {
-                "input": {
-                    "months": values[0],
-                    "days": values[1],
-                    "hours": values[2],
-                    "minutes": values[3],
-                    "seconds": values[4]
-                },
-                "timedelta": timedelta(
-                    days=values[0] * 30 + values[1],
-                    hours=values[2],
-                    minutes=values[3],
-                    seconds=values[4])
-            }
-            await schedule_app_check(cd, False, update, context)
+    apps = cd["first_boot_configuration"]["apps"]
+    found, failed = cd.pop("first_boot_apps", None) or await fetch_first_boot_apps(apps)
+
+    now = clock.now()
+    deadlines = {}
+    for app_index in apps:
+        if (app_details := found.get(app_index)) is None:
+            continue
+        values = await parse_interval(apps[app_index]["interval"])
+        new_index = add_app_record(cd, ap := AppRecord(
+            app_name=app_details["title"],
+            app_id=app_details["appId"],
+            app_link=app_details["url"],
+            current_version=app_details["version"],
+            last_update=datetime.strptime(app_details["lastUpdatedOn"], "%b %d, %Y"),
+            interval_input=IntervalInput(*values),
+            send_on_check=apps[app_index]["send_on_check"],
+            adaptive=job_queue.new_adaptive_state(bool(apps[app_index].get("adaptive", False)))
+        ))
+        # le app della configurazione hanno spesso lo stesso intervallo: senza jitter scadrebbero tutte insieme
+        ap.next_check = now + ap.interval + job_queue.phase_jitter(ap.interval)
+        deadlines[new_index] = ap.next_check
+
+    # tutte le app vengono registrate nello scheduler con un'unica operazione
+    check_scheduler.schedule_many(update.effective_chat.id, deadlines)
 
     context.bot_data["settings"]["max_backups"] = int(dp["max_backups"])
 
@@ -627,10 +650,18 @@ async def load_first_boot_configuration(update: Update, context: CallbackContext
         ]
     ]
 
+    if failed:
+        text = ("✅ <b>First Boot Configuration Completed</b>\n\n"
+                f"🔹 Impostazioni configurate e {len(found)} app su {len(apps)} aggiunte.\n\n"
+                "⚠️ <u>App non aggiunte</u>\n" +
+                "\n".join(f"🔸 <code>{apps[i]['link']}</code> – <i>{reason}</i>" for i, reason in failed.items()))
+    else:
+        text = ("✅ <b>First Boot Configuration Completed</b>\n\n"
+                "🔹 Tutte le impostazioni e le app sono state configurate correttamente.")
+
     await send_message_with_typing_action(data={
         "chat_id": update.effective_chat.id,
-        "text": "✅ <b>First Boot Configuration Completed</b>\n\n"
-                "🔹 Tutte le impostazioni e le app sono state configurate correttamente.",
+        "text": text,
         "keyboard": keyboard,
         "close_button": [1, 1]
     }, context=context)
@@ -640,9 +671,40 @@ async def load_first_boot_configuration(update: Update, context: CallbackContext
     return ConversationHandler.END
 
 
+async def fetch_first_boot_apps(apps: dict) -> tuple[dict, dict]:
+    """
+    Scarica contemporaneamente i dettagli di tutte le app di 'first_boot.yml' (il parallelismo è limitato da
+    'play_store.fetch_pool'). Restituisce i dettagli delle app trovate e il motivo del fallimento di quelle non
+    trovate, entrambi indicizzati come nel file.
+    """
+    async def fetch_one(link: str):
+        try:
+            app_id = await get_app_id_from_link(link)
+        except IndexError:
+            return None
+        return await play_store.cached_fetch(app_id)
+
+    results = await asyncio.gather(*(fetch_one(apps[app_index]["link"]) for app_index in apps))
+
+    found, failed = {}, {}
+    for app_index, result in zip(apps, results):
+        if result is None:
+            failed[app_index] = "link non valido"
+        elif not result.ok():
+            failed[app_index] = "app non trovata" if result.not_found() else f"errore di rete ({result.reason})"
+        else:
+            found[app_index] = result.details
+
+    for app_index, reason in failed.items():
+        bot_logger.warning(f"First Boot Configuration – App with link '{apps[app_index]['link']}' not added: {reason}")
+
+    return found, failed
+
+
 async def send_message_with_typing_action(data: dict, context: CallbackContext, action: ChatAction = ChatAction.TYPING):
     await check_dict_keys(data, ["chat_id", "text"])
 
+    metrics.inc("scheduled_messages_total")
     await context.bot.send_chat_action(chat_id=data["chat_id"], action=action)
     context.job_queue.run_once(
         callback=job_queue.scheduled_send_message,
@@ -663,50 +725,25 @@ async def schedule_app_check(cd: dict, send_message: bool, update: Update, conte
     added = True if "editing" not in cd else False
 
     if added:
-        ap = cd["apps"][len(cd["apps"])]
+        # l'ultima app inserita (vedi 'add_app_record')
+        index = next(reversed(cd["apps"]))
     else:
         index = int(cd["app_index_to_edit"])
-        ap = context.chat_data["apps"][index]
         del cd["app_index_to_edit"]
         del context.chat_data["editing"]
+    ap = cd["apps"][index]
 
-    ap["next_check"] = {}
-    ap["next_check"] = datetime.now(timezone('Europe/Rome')) + ap["check_interval"]["timedelta"]
-
-    if not added:
-        jobs = context.job_queue.get_jobs_by_name(ap['app_name'])
-        if len(jobs) > 0:
-            for job in jobs:
-                job.schedule_removal()
-
-    # noinspection PyUnboundLocalVariable
-    context.job_queue.run_repeating(
-        callback=job_queue.scheduled_app_check,
-        interval=ap["check_interval"]["timedelta"],
-        chat_id=update.effective_chat.id,
-        name=ap['app_name'],
-        data={
-            "chat_data": cd,
-            "app_link": ap["app_link"],
-            "app_id": ap["app_id"],
-            "app_index": len(cd["apps"]) if added else index
-        }
-    )
+    ap.next_check = clock.now() + ap.interval + job_queue.phase_jitter(ap.interval)
+
+    check_scheduler.schedule(update.effective_chat.id, index, ap.next_check)
 
     if send_message:
         text = (f"☑️ <b>App Settled Successfully</b>\n\n"
                 f"🔹<u>Check Interval</u> ➡ "
-                f"<code>"
-                f"{ap['check_interval']['input']['months']}m"
-                f"{ap['check_interval']['input']['days']}d"
-                f"{ap['check_interval']['input']['hours']}h"
-                f"{ap['check_interval']['input']['minutes']}"
-                f"min"
-                f"{ap['check_interval']['input']['seconds']}s"
-                f"</code>\n"
+                f"<code>{ap.interval_text}</code>\n"
                 f"🔹<u>Send On Check</u> ➡ "
-                f"<code>{ap['send_on_check']}</code>\n\n"
-                f"🔸 <u>Next Check</u> ➡ <code>{ap['next_check'].strftime('%d %B %Y – %H:%M:%S')}</code>"
+                f"<code>{ap.send_on_check}</code>\n\n"
+                f"🔸 <u>Next Check</u> ➡ <code>{ap.next_check.strftime('%d %B %Y – %H:%M:%S')}</code>"
                 f"\n\n")
 
         if added:
@@ -743,10 +780,8 @@ async def schedule_app_check(cd: dict, send_message: bool, update: Update, conte
 
         await send_message_with_typing_action(data=data, context=context)
 
-    next_check = datetime.now(timezone('Europe/Rome')) + ap['check_interval']['timedelta']
-
-    bot_logger.info(f"Repeating Job for app {ap['app_name']} Scheduled Successfully "
-                    f"– Next Check at {next_check.strftime('%d %b %Y - %H:%M:%S')}")
+    bot_logger.info(f"Repeating Job for app {ap.app_name} Scheduled Successfully "
+                    f"– Next Check at {ap.next_check.strftime('%d %b %Y - %H:%M:%S')}")
 
     if "editing" in cd:
         del context.chat_data["editing"]
@@ -755,7 +790,10 @@ async def schedule_app_check(cd: dict, send_message: bool, update: Update, conte
 
 
 async def yaml_dict_dumper(cd: dict, filepath: str) -> bool:
-    return serialize_dict_to_yaml(cd, filepath)
+    written = serialize_dict_to_yaml(cd, filepath)
+    # usato solo per i backup
+    backup_sizes.refresh()
+    return written
 
 
 async def yaml_dict_loader(filepath: str):
@@ -3,6 +3,8 @@ import datetime
 import logging
 from logging import handlers
 
+from app_record import AppRecord
+
 br_logger = logging.getLogger('br_logger')
 br_logger.setLevel(logging.INFO)
 formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -34,7 +36,13 @@ def timedelta_constructor(loader, node):
     return datetime.timedelta(**value)
 
 
+def app_record_representer(dumper, record):
+    # i backup restano nel formato dict delle versioni precedenti (riconvertiti con 'app_record.upgrade_apps')
+    return dumper.represent_dict(record.to_dict())
+
+
 yaml.add_representer(datetime.timedelta, timedelta_representer)
+yaml.add_representer(AppRecord, app_record_representer)
 yaml.add_constructor('!timedelta', timedelta_constructor)
 
 
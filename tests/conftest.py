@@ -0,0 +1,8 @@
+import os
+import sys
+
+# i moduli del bot si importano con 'modules/' nel path (come in produzione) e aprono i log in "logs/"
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPO_DIR, os.path.join(REPO_DIR, "modules"), os.path.join(REPO_DIR, "bench")]
+os.chdir(REPO_DIR)
+os.makedirs("logs", exist_ok=True)
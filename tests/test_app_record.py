@@ -0,0 +1,65 @@
+import pickle
+from datetime import datetime, timedelta
+
+import pytest
+
+from app_record import AppRecord, IntervalInput, upgrade_apps
+
+LEGACY = {
+    "app_name": "Roblox",
+    "app_id": "com.roblox.client",
+    "app_link": "https://play.google.com/store/apps/details?id=com.roblox.client",
+    "current_version": "2.650.1",
+    "last_check": datetime(2026, 1, 2, 10, 30),
+    "last_update": "01 January 2026",
+    "check_interval": {
+        "input": {"months": 0, "days": 1, "hours": 2, "minutes": 3, "seconds": 4},
+        "timedelta": timedelta(days=1, hours=2, minutes=3, seconds=4)
+    },
+    "next_check": datetime(2026, 1, 3, 12, 33, 34),
+    "send_on_check": True,
+    "suspended": False,
+    "adaptive": {"enabled": True, "no_change": 2, "factor": 4}
+}
+
+
+def test_from_dict_to_dict_round_trip():
+    record = AppRecord.from_dict(LEGACY)
+
+    assert record.last_update == datetime(2026, 1, 1)
+    assert record.interval == LEGACY["check_interval"]["timedelta"]
+    assert record.interval_input == IntervalInput(0, 1, 2, 3, 4)
+    assert record.interval_text == "0m1d2h3min4s"
+    assert record.to_dict() == LEGACY
+    assert AppRecord.from_dict(record.to_dict()).to_dict() == LEGACY
+
+
+def test_from_dict_accepts_datetime_last_update_and_missing_optionals():
+    legacy = {k: v for k, v in LEGACY.items() if k not in ("adaptive", "suspended", "send_on_check")}
+    legacy["last_update"] = datetime(2026, 1, 1)
+
+    record = AppRecord.from_dict(legacy)
+
+    assert record.last_update_text == "01 January 2026"
+    assert record.adaptive is None and record.suspended is False and record.send_on_check is False
+
+
+def test_months_count_as_thirty_days():
+    assert IntervalInput(months=2, days=1).timedelta() == timedelta(days=61)
+
+
+def test_pickle_round_trip():
+    record = AppRecord.from_dict(LEGACY)
+
+    restored = pickle.loads(pickle.dumps(record))
+
+    assert restored.to_dict() == LEGACY
+
+
+@pytest.mark.parametrize("broken", [{"app_name": "x"}, {**LEGACY, "last_update": "not a date"}])
+def test_upgrade_apps_converts_valid_dicts_only(broken):
+    cd = {"apps": {1: dict(LEGACY), 2: broken, 3: AppRecord.from_dict(LEGACY)}}
+
+    assert upgrade_apps(cd) == 1
+    assert isinstance(cd["apps"][1], AppRecord)
+    assert cd["apps"][2] is broken
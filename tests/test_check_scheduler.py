@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+from check_scheduler import CheckScheduler
+
+T0 = datetime(2026, 1, 1, 12, 0)
+
+
+def minutes(n: float) -> datetime:
+    return T0 + timedelta(minutes=n)
+
+
+def test_pop_due_returns_due_entries_in_deadline_order():
+    s = CheckScheduler()
+    s.schedule(1, 1, minutes(3))
+    s.schedule(1, 2, minutes(1))
+    s.schedule(2, 1, minutes(2))
+    s.schedule(2, 2, minutes(10))
+
+    assert s.pop_due(minutes(5)) == [(1, 2, minutes(1)), (2, 1, minutes(2)), (1, 1, minutes(3))]
+    assert len(s) == 1
+    assert (2, 2) in s and (1, 1) not in s
+    assert s.pop_due(minutes(5)) == []
+
+
+def test_reschedule_replaces_previous_deadline():
+    s = CheckScheduler()
+    s.schedule(1, 1, minutes(1))
+    s.schedule(1, 1, minutes(20))
+
+    assert len(s) == 1
+    assert s.get_deadline(1, 1) == minutes(20)
+    assert s.pop_due(minutes(5)) == []
+    assert s.pop_due(minutes(30)) == [(1, 1, minutes(20))]
+
+
+def test_cancel_is_lazy_and_skipped_by_pop_due():
+    s = CheckScheduler()
+    s.schedule(1, 1, minutes(1))
+    s.schedule(1, 2, minutes(2))
+
+    assert s.cancel(1, 1) is True
+    assert s.cancel(1, 1) is False
+    assert s.get_deadline(1, 1) is None
+    assert s.next_deadline() == minutes(2)
+    assert s.pop_due(minutes(5)) == [(1, 2, minutes(2))]
+    assert len(s) == 0 and s.counts() == {}
+
+
+def test_cancel_chat_only_touches_that_chat():
+    s = CheckScheduler()
+    s.schedule_many(1, {i: minutes(i) for i in range(1, 6)})
+    s.schedule_many(2, {i: minutes(i) for i in range(1, 4)})
+
+    assert s.counts() == {1: 5, 2: 3}
+    s.cancel_chat(1)
+    s.cancel_chat(3)
+
+    assert len(s) == 3
+    assert s.count(1) == 0 and s.count(2) == 3
+    assert [chat_id for chat_id, _, _ in s.pop_due(minutes(10))] == [2, 2, 2]
+    assert len(s) == 0
+
+
+def test_heap_is_compacted_after_many_reschedules():
+    s = CheckScheduler()
+    for n in range(1000):
+        s.schedule(1, n % 10, minutes(n))
+
+    assert len(s) == 10
+    assert len(s._heap) <= 2 * len(s) + 64
+    assert [app_index for _, app_index, _ in s.pop_due(minutes(1000))] == list(range(10))
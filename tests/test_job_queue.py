@@ -0,0 +1,73 @@
+import asyncio
+import datetime
+
+import job_queue
+from app_record import AppRecord, IntervalInput
+
+NOW = datetime.datetime(2026, 1, 1, 12, 0)
+
+
+def test_plan_catch_up_orders_by_lateness_within_window():
+    overdue = [(datetime.timedelta(minutes=m), 100 + m, m) for m in (5, 60, 1, 30)]
+
+    plan = job_queue.plan_catch_up(overdue, NOW)
+
+    # le app più in ritardo vengono recuperate per prime
+    assert [app_index for _, app_index, _ in plan] == [60, 30, 5, 1]
+    assert [chat_id for chat_id, _, _ in plan] == [160, 130, 105, 101]
+    whens = [when for _, _, when in plan]
+    assert whens == sorted(whens)
+    slot = job_queue.CATCH_UP_WINDOW_SECONDS / len(overdue)
+    for n, when in enumerate(whens):
+        offset = (when - NOW).total_seconds() - 1
+        assert n * slot <= offset <= (n + 1) * slot
+
+
+def test_plan_catch_up_empty():
+    assert job_queue.plan_catch_up([], NOW) == []
+
+
+def test_phase_jitter_bounded_by_tenth_of_interval():
+    interval = datetime.timedelta(seconds=30)
+    for _ in range(100):
+        assert datetime.timedelta(0) <= job_queue.phase_jitter(interval) <= datetime.timedelta(seconds=3)
+
+
+def test_scheduled_app_check_skips_removed_app(monkeypatch):
+    async def cached_fetch(app_id):
+        raise AssertionError("fetch of a removed app")
+
+    monkeypatch.setattr(job_queue.play_store, "cached_fetch", cached_fetch)
+    data = {"chat_data": {"chat_id": 1, "apps": {}}, "app_id": "com.example.app", "app_link": "", "app_index": 3}
+
+    assert asyncio.run(job_queue.scheduled_app_check(None, data)) is None
+
+
+def test_adaptive_interval_never_exceeds_user_interval():
+    interval = datetime.timedelta(hours=8)
+    ap = AppRecord("Example", "com.example.app", "", "1.0.0", NOW, IntervalInput(hours=8),
+                   adaptive=job_queue.new_adaptive_state(True))
+
+    intervals = [job_queue.effective_interval(ap)]
+    for _ in range(10 * job_queue.ADAPTIVE_NO_CHANGE_STREAK):
+        job_queue.update_adaptive_state(ap, update_found=False)
+        intervals.append(job_queue.effective_interval(ap))
+
+    assert intervals[0] == interval / job_queue.ADAPTIVE_MAX_FACTOR
+    assert intervals == sorted(intervals) and max(intervals) == interval
+
+    job_queue.update_adaptive_state(ap, update_found=True)
+    assert job_queue.effective_interval(ap) == interval / job_queue.ADAPTIVE_MAX_FACTOR
+
+    # stato salvato dalla versione precedente, con l'intervallo allungato oltre quello impostato
+    ap.adaptive["factor"] = 8
+    assert job_queue.effective_interval(ap) == interval
+
+
+def test_adaptive_interval_floor():
+    ap = AppRecord("Example", "com.example.app", "", "1.0.0", NOW, IntervalInput(minutes=1),
+                   adaptive=job_queue.new_adaptive_state(True))
+    assert job_queue.effective_interval(ap) == datetime.timedelta(seconds=job_queue.ADAPTIVE_MIN_SECONDS)
+
+    ap.set_interval(IntervalInput(seconds=10))
+    assert job_queue.effective_interval(ap) == datetime.timedelta(seconds=10)
@@ -0,0 +1,42 @@
+import logging
+import queue
+from logging import handlers
+
+import log_pipeline
+from log_pipeline import BatchQueueListener, RateLimitFilter
+
+
+def _record(msg: str, *args) -> logging.LogRecord:
+    return logging.LogRecord("job_queue_logger", logging.ERROR, __file__, 0, msg, args, None)
+
+
+def test_rate_limit_filter_drops_repeats_and_reports_them(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(log_pipeline.time, "monotonic", lambda: now[0])
+    limit = RateLimitFilter(burst=2, window=60)
+
+    assert [limit.filter(_record("Not Able to Get Link %s: %s", i, "503")) for i in range(4)] == \
+        [True, True, False, False]
+    # template diverso: non conta come ripetizione
+    assert limit.filter(_record("App '%s' not found: %s", "x", "404"))
+
+    now[0] += 60
+    record = _record("Not Able to Get Link %s: %s", 9, "503")
+    assert limit.filter(record)
+    assert record.getMessage().endswith("[2 messaggi uguali soppressi]")
+
+
+def test_listener_leaves_rotation_to_the_file_handler(tmp_path):
+    logger = logging.getLogger("test_log_pipeline")
+    handler = handlers.RotatingFileHandler(tmp_path / "test.log", maxBytes=200, backupCount=1)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log_queue = queue.SimpleQueue()
+    listener = BatchQueueListener(log_queue, {logger: [handler]}, batch_size=4)
+    listener.start()
+    for i in range(20):
+        log_queue.put(logger.makeRecord(logger.name, logging.WARNING, __file__, 0, f"record {i:02d}", None, None))
+    listener.stop()
+    handler.close()
+
+    assert (tmp_path / "test.log.1").is_file()
+    assert (tmp_path / "test.log").read_text().splitlines()[-1] == "record 19"
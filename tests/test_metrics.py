@@ -0,0 +1,31 @@
+import asyncio
+
+from metrics import BackupSizes, TimedPicklePersistence, metrics
+
+
+def test_persistence_times_public_update_methods(tmp_path):
+    persistence = TimedPicklePersistence(filepath=tmp_path / "persistence")
+
+    async def run():
+        await persistence.update_chat_data(1, {"apps": {}})
+        await persistence.flush()
+
+    asyncio.run(run())
+
+    assert (tmp_path / "persistence").is_file()
+    histograms = metrics.histograms["persistence_write_seconds"]
+    assert histograms[(("method", "update_chat_data"),)].count >= 1
+    assert histograms[(("method", "flush"),)].count >= 1
+
+
+def test_backup_sizes_are_cached_until_refresh(tmp_path):
+    (tmp_path / "1").mkdir()
+    (tmp_path / "1" / "a.yml").write_text("x" * 10)
+    sizes = BackupSizes(str(tmp_path))
+    assert sizes.get() == (1, 10)
+
+    (tmp_path / "1" / "b.yml").write_text("x" * 5)
+    assert sizes.get() == (1, 10)
+
+    sizes.refresh()
+    assert sizes.get() == (2, 15)
@@ -0,0 +1,259 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import play_store
+from fake_play_store import FakeApp, FakePlayStore
+from play_store import CircuitBreaker, CircuitOpenError, DetailsCache, FetchPool
+
+APP = FakeApp("com.example.app", "Example", "1.0.0", "Jan 1, 2026")
+STORE = FakePlayStore({APP.app_id: APP}, latency=0, jitter=0, rate_limit=None, padding_kb=0, etag=False)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def monotonic(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(play_store.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """
+    Play Store finto servito tramite httpx.MockTransport: 'requests' conta le richieste, 'status' forza il codice
+    di risposta e 'delay' simula la latenza.
+    """
+    state = {"requests": 0, "status": 200, "delay": 0.0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        state["requests"] += 1
+        await asyncio.sleep(state["delay"])
+        if state["status"] != 200:
+            return httpx.Response(state["status"])
+        if request.url.params.get("id") != APP.app_id:
+            return httpx.Response(404)
+        return httpx.Response(200, text=STORE.render(APP))
+
+    monkeypatch.setattr(play_store, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(play_store, "fetch_pool", FetchPool(concurrency=8, rate=1000, burst=1000))
+    monkeypatch.setattr(play_store, "change_detector", play_store.ChangeDetector(maxsize=16))
+    monkeypatch.setattr(play_store, "retry_policy", play_store.RetryPolicy(attempts=1, base_delay=0, max_delay=0))
+    return state
+
+
+def test_breaker_opens_after_threshold_and_recovers_through_half_open(monotonic):
+    breaker = CircuitBreaker("host", failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    monotonic.now += 60
+    # una sola richiesta di prova
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+    assert breaker.transitions == 3 and breaker.rejected == 2
+
+
+def test_breaker_half_open_failure_reopens(monotonic):
+    breaker = CircuitBreaker("host", failure_threshold=5, reset_timeout=60)
+    breaker.record_failure(rate_limited=True)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    monotonic.now += 60
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    monotonic.now += 59
+    assert not breaker.allow()
+
+
+def test_breaker_cancelled_probe_can_be_retried(monotonic):
+    breaker = CircuitBreaker("host", failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    monotonic.now += 60
+    assert breaker.allow()
+
+    breaker.release_probe()
+    assert breaker.allow()
+
+
+def test_pool_rejects_when_breaker_open(store):
+    store["status"] = 503
+
+    async def run():
+        client = play_store.get_client()
+        for _ in range(play_store.PLAY_BREAKER_FAILURES):
+            assert (await play_store.fetch_pool.get(client, "http://play.test/x")).status_code == 503
+        with pytest.raises(CircuitOpenError):
+            await play_store.fetch_pool.get(client, "http://play.test/x")
+
+    asyncio.run(run())
+    assert store["requests"] == play_store.PLAY_BREAKER_FAILURES
+    assert play_store.fetch_pool.breaker("play.test").state == CircuitBreaker.OPEN
+
+
+def test_breaker_failure_while_open_does_not_reopen(monotonic):
+    breaker = CircuitBreaker("host", failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    monotonic.now += 30
+    breaker.record_failure(rate_limited=True)
+
+    assert breaker.state == CircuitBreaker.OPEN and breaker.transitions == 1
+    # l'apertura non viene prolungata
+    monotonic.now += 30
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_pool_does_not_send_queued_requests_after_breaker_opens(store, monkeypatch):
+    monkeypatch.setattr(play_store, "fetch_pool", FetchPool(concurrency=1, rate=1000, burst=1000))
+    store["status"] = 429
+
+    async def run():
+        client = play_store.get_client()
+        return await asyncio.gather(*(play_store.fetch_pool.get(client, "http://play.test/x") for _ in range(30)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert store["requests"] == 1
+    assert results[0].status_code == 429
+    assert all(isinstance(r, CircuitOpenError) for r in results[1:])
+    breaker = play_store.fetch_pool.breaker("play.test")
+    assert breaker.transitions == 1 and breaker.rejected == 29
+
+
+def test_queue_wait_does_not_count_towards_deadline(store, monkeypatch):
+    # 40 richieste a 40/s: le ultime restano in coda circa un secondo, ben oltre entrambe le deadline
+    monkeypatch.setattr(play_store, "PLAY_FETCH_DEADLINE", 0.2)
+    monkeypatch.setattr(play_store, "PLAY_CHECK_DEADLINE", 0.2)
+    monkeypatch.setattr(play_store, "fetch_pool", FetchPool(concurrency=8, rate=40, burst=1))
+
+    async def run():
+        return await asyncio.gather(*(play_store.fetch(APP.app_id) for _ in range(40)))
+
+    results = asyncio.run(run())
+
+    assert all(r.ok() for r in results)
+    stats = play_store.fetch_pool.stats()
+    assert stats["deadline_exceeded"] == 0 and stats["max_wait"] > 0.2
+
+
+def test_slow_request_exceeds_deadline(store, monkeypatch):
+    monkeypatch.setattr(play_store, "PLAY_FETCH_DEADLINE", 0.05)
+    store["delay"] = 0.2
+
+    result = asyncio.run(play_store.fetch(APP.app_id))
+
+    assert not result.ok() and result.reason == "Deadline Exceeded"
+    assert play_store.fetch_pool.stats()["deadline_exceeded"] == 1
+    assert play_store.fetch_pool.breaker("play.google.com").failures == 1
+
+
+def test_check_deadline_bounds_retries_of_hanging_requests(store, monkeypatch):
+    # ogni tentativo supera la deadline della singola richiesta: senza il limite complessivo servirebbero ~0.5s
+    monkeypatch.setattr(play_store, "PLAY_FETCH_DEADLINE", 0.1)
+    monkeypatch.setattr(play_store, "PLAY_CHECK_DEADLINE", 0.25)
+    monkeypatch.setattr(play_store, "retry_policy", play_store.RetryPolicy(attempts=5, base_delay=0, max_delay=0))
+    store["delay"] = 10
+
+    async def run():
+        started = time.monotonic()
+        return await play_store.fetch(APP.app_id), time.monotonic() - started
+
+    result, elapsed = asyncio.run(run())
+
+    assert not result.ok() and result.reason == "Deadline Exceeded"
+    assert 0.25 <= elapsed < 0.4
+    assert store["requests"] == 3
+
+
+def test_fetch_extracts_details(store):
+    result = asyncio.run(play_store.fetch(APP.app_id))
+
+    assert result.ok() and not result.unchanged
+    assert result.details["title"] == APP.title
+    assert result.details["version"] == APP.version
+    assert result.details["lastUpdatedOn"] == APP.last_updated_on
+
+
+def test_fetch_unchanged_page_matches_digest(store):
+    async def run():
+        return await play_store.fetch(APP.app_id), await play_store.fetch(APP.app_id)
+
+    first, second = asyncio.run(run())
+
+    assert not first.unchanged and second.unchanged and second.ok()
+    assert play_store.change_detector.stats()["same_digest"] == 1
+
+
+def test_fetch_refetches_304_after_validators_evicted(store, monkeypatch):
+    # i validatori erano presenti quando sono stati calcolati gli header, ma sono stati rimossi prima della risposta
+    conditional = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        conditional.append("If-None-Match" in request.headers)
+        if "If-None-Match" in request.headers:
+            return httpx.Response(304)
+        return httpx.Response(200, text=STORE.render(APP))
+
+    monkeypatch.setattr(play_store, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(play_store.change_detector, "conditional_headers", lambda app_id: {"If-None-Match": '"x"'})
+
+    result = asyncio.run(play_store.fetch(APP.app_id))
+
+    assert result.ok() and result.details["version"] == APP.version
+    assert conditional == [True, False]
+    assert play_store.change_detector.stats()["refetched"] == 1
+
+
+def test_fetch_not_found(store):
+    result = asyncio.run(play_store.fetch("com.example.missing"))
+
+    assert not result.ok() and result.not_found()
+
+
+def test_cache_coalesces_concurrent_fetches_and_serves_hits(store):
+    store["delay"] = 0.05
+    cache = DetailsCache(ttl=30, maxsize=16)
+
+    async def run():
+        results = await asyncio.gather(*(cache.get(APP.app_id) for _ in range(10)))
+        results.append(await cache.get(APP.app_id))
+        return results
+
+    results = asyncio.run(run())
+
+    assert store["requests"] == 1
+    assert all(r is results[0] and r.ok() for r in results)
+    assert (cache.misses, cache.coalesced, cache.hits) == (1, 9, 1)
+    assert cache.stats()["in_flight"] == 0
+
+
+def test_cache_does_not_keep_failures(store):
+    store["status"] = 503
+    cache = DetailsCache(ttl=30, maxsize=16)
+
+    async def run():
+        await cache.get(APP.app_id)
+        await cache.get(APP.app_id)
+
+    asyncio.run(run())
+
+    assert cache.misses == 2 and cache.hits == 0
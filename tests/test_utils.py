@@ -0,0 +1,42 @@
+import asyncio
+import datetime
+
+import play_store
+import utils
+from app_record import AppRecord
+from play_store import FetchResult
+from google_play_scraper.exceptions import NotFoundError
+
+LINK = "https://play.google.com/store/apps/details?id={}&hl=it"
+NOW = datetime.datetime(2026, 1, 1, 12, 0)
+
+
+def test_fetch_first_boot_apps_reports_failures_together(monkeypatch):
+    async def cached_fetch(app_id: str) -> FetchResult:
+        if app_id == "com.missing":
+            return FetchResult(app_id, "", 404, "Not Found", error=NotFoundError("App not found(404)."))
+        return FetchResult(app_id, "", 200, "OK", details={"title": app_id})
+
+    monkeypatch.setattr(play_store, "cached_fetch", cached_fetch)
+    apps = {
+        1: {"link": LINK.format("com.ok")},
+        2: {"link": LINK.format("com.missing")},
+        3: {"link": "https://example.com/no-id"},
+        4: {"link": LINK.format("com.ok2")}
+    }
+
+    found, failed = asyncio.run(utils.fetch_first_boot_apps(apps))
+
+    assert {i: d["title"] for i, d in found.items()} == {1: "com.ok", 4: "com.ok2"}
+    assert failed == {2: "app non trovata", 3: "link non valido"}
+
+
+def test_app_indexes_are_not_reused():
+    # dati di una versione precedente: niente contatore
+    cd = {"chat_id": 1, "apps": {1: AppRecord("A", "com.a", "", "1", NOW), 4: AppRecord("B", "com.b", "", "1", NOW)}}
+    assert utils.next_app_index(cd) == 5
+
+    index = utils.add_app_record(cd, AppRecord("C", "com.c", "", "1", NOW))
+    del cd["apps"][index]
+    assert utils.add_app_record(cd, AppRecord("D", "com.d", "", "1", NOW)) == index + 1
+    assert utils.next_app_index(cd) == index + 2